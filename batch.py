@@ -0,0 +1,182 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.managers import SyncManager
+from pathlib import Path
+
+import rate_limit
+from dashboard_pages import HIGH_THRESHOLD, iter_by_score
+from metrics import METRICS
+from rate_limit import process_shared
+from repository_analyzer import RepositoryAnalyzer
+
+
+class BatchManager(SyncManager):
+    """Процесс-менеджер с общими для всех воркеров объектами: лимитер GitHub и семафор LLM."""
+
+
+BatchManager.register("RateLimiter", process_shared)
+
+
+def repo_slug(repo: str) -> str:
+    return repo.replace("/", "__")
+
+
+def prepare_work_dir(root: Path, repo: str, base_cfg: dict) -> Path:
+    """data/repos/<owner>__<name>/config.json — общий конфиг с подставленным repo."""
+    work = root / "data" / "repos" / repo_slug(repo)
+    work.mkdir(parents=True, exist_ok=True)
+    cfg = {k: v for k, v in base_cfg.items() if k != "repos"}
+    cfg["repo"] = repo
+    text = json.dumps(cfg, ensure_ascii=False, indent=2)
+    path = work / "config.json"
+    # перезаписываем только при изменении: config.json входит в отпечатки шагов конвейера
+    if not path.exists() or path.read_text(encoding="utf-8") != text:
+        path.write_text(text, encoding="utf-8")
+    return work
+
+
+def _init_worker(limiter, llm_slots, tools_dir: str):
+    rate_limit.SHARED = limiter
+    if tools_dir not in sys.path:
+        sys.path.insert(0, tools_dir)
+    import enrich_semantics
+
+    enrich_semantics.LLM_SLOTS = llm_slots
+
+
+def _run_repo(root: str, work_dir: str, repo: str, opts: dict) -> dict:
+    t0 = time.time()
+    # процесс пула переиспользуется: метрики прошлого репозитория не должны попасть в metrics.json этого
+    METRICS.reset()
+    analyzer = RepositoryAnalyzer(
+        repo_root=root,
+        work_dir=work_dir,
+        github_repo=repo,
+        incremental=opts["incremental"],
+        llm_workers=opts["llm_workers"],
+    )
+    try:
+        result = analyzer.run_full_analysis(with_llm=opts["with_llm"], force=opts["force"])
+    except (Exception, SystemExit) as e:
+        # упавший репозиторий не останавливает остальные — ошибка попадёт в итоговую сводку;
+        # скрипты конвейера сообщают о фатальном (нет токена, нет config) через sys.exit
+        return {"repo": repo, "error": f"{type(e).__name__}: {e}", "seconds": round(time.time() - t0, 1)}
+    return {
+        "repo": repo,
+        "dashboard": str(analyzer.dashboard_json),
+        "prs": len(result.get("prs", [])),
+        "seconds": round(time.time() - t0, 1),
+    }
+
+
+def cross_repo_ranking(results: list[dict], top: int = 100, thr: float = HIGH_THRESHOLD) -> dict:
+    """
+    Общий рейтинг по дашбордам всех репозиториев: top-K PR по score (куча, без полной сортировки)
+    и сводка по каждому репозиторию. score нормирован внутри своего репозитория,
+    поэтому рейтинг сравнивает относительный риск PR в его проекте.
+    """
+    prs = []
+    repos = []
+    for res in results:
+        if "dashboard" not in res:
+            repos.append({"repo": res["repo"], "error": res.get("error")})
+            continue
+        with open(res["dashboard"], "r", encoding="utf-8") as f:
+            items = json.load(f).get("prs", [])
+        scores = [e.get("score") or 0 for e in items]
+        repos.append({
+            "repo": res["repo"],
+            "prs": len(items),
+            "high": sum(1 for s in scores if s >= thr),
+            "mean_score": round(sum(scores) / len(scores), 4) if scores else None,
+            "max_score": max(scores, default=None),
+            "seconds": res.get("seconds"),
+        })
+        prs.extend(dict(e, repo=res["repo"]) for e in items)
+    repos.sort(key=lambda r: (r.get("high") or 0, r.get("mean_score") or 0), reverse=True)
+    return {"repos": repos, "top": list(iter_by_score(prs, top))}
+
+
+def run_batch(
+    repos: list[str],
+    root: Path,
+    base_cfg: dict,
+    workers: int = 4,
+    llm_concurrency: int = 2,
+    with_llm: bool = True,
+    incremental: bool = False,
+    force: tuple[str, ...] = (),
+    top: int = 100,
+) -> dict:
+    """
+    Анализ нескольких репозиториев параллельно в пуле процессов, каждый в своём data/repos/<repo>/.
+    Все процессы берут запросы к GitHub у одного RateLimiter в процессе-менеджере и делят
+    llm_concurrency одновременных запросов к Ollama — время ограничено квотой, а не числом репозиториев.
+    """
+    root = Path(root).resolve()
+    opts = {
+        "with_llm": with_llm,
+        "incremental": incremental,
+        "force": tuple(force),
+        # воркеров enrich_semantics больше общего числа слотов держать незачем
+        "llm_workers": max(1, llm_concurrency),
+    }
+    results = []
+    with BatchManager() as mgr:
+        limiter = mgr.RateLimiter(base_cfg, "batch")
+        llm_slots = mgr.BoundedSemaphore(max(1, llm_concurrency))
+        with ProcessPoolExecutor(
+            max_workers=max(1, min(workers, len(repos))),
+            initializer=_init_worker,
+            initargs=(limiter, llm_slots, str(root / "tools")),
+        ) as ex:
+            futures = {
+                ex.submit(_run_repo, str(root), str(prepare_work_dir(root, repo, base_cfg)), repo, opts): repo
+                for repo in repos
+            }
+            for fut in as_completed(futures):
+                res = fut.result()
+                results.append(res)
+                status = res.get("error") or f"{res['prs']} PRs"
+                print(f"[batch] {res['repo']}: {status} ({res['seconds']}s)")
+        limiter.report("batch rate limit")
+    ranking = cross_repo_ranking(results, top)
+    out = root / "data" / "derived" / "batch_ranking.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(ranking, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(out)
+    return ranking
+
+
+def main(argv=None):
+    root = Path(__file__).parent.resolve()
+    with (root / "config.json").open("r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repos", default=None)  # owner/name через запятую; по умолчанию "repos" из config.json
+    ap.add_argument("--workers", type=int, default=cfg.get("batch_workers", 4))
+    ap.add_argument("--llm_concurrency", type=int, default=cfg.get("llm_concurrency", 2))
+    ap.add_argument("--no_llm", action="store_true")
+    ap.add_argument("--incremental", action="store_true")
+    ap.add_argument("--force", default="")
+    ap.add_argument("--top", type=int, default=100)
+    args = ap.parse_args(argv)
+    repos = args.repos.split(",") if args.repos else cfg.get("repos") or [cfg["repo"]]
+    run_batch(
+        [r.strip() for r in repos if r.strip()],
+        root,
+        cfg,
+        workers=args.workers,
+        llm_concurrency=args.llm_concurrency,
+        with_llm=not args.no_llm,
+        incremental=args.incremental,
+        force=tuple(filter(None, args.force.split(","))),
+        top=args.top,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import heapq
+import json
+import math
+import os
+
+# те же константы, что в index.html: фиксированный порог высокой зоны и число столбцов гистограммы
+HIGH_THRESHOLD = 0.25
+BINS = 24
+
+
+def pages_config(cfg, root=None):
+    """
+    Секция "dashboard_pages" config.json: {"dir", "page_size", "max_pages"}, dir — относительно каталога проекта root;
+    None — страницы не пишутся.
+    """
+    c = cfg.get("dashboard_pages")
+    if not c:
+        return None
+    return {"out_dir": os.path.join(root or "", c.get("dir", "data/derived/dashboard")), "page_size": int(c.get("page_size", 200)),
+            "max_pages": c.get("max_pages")}
+
+
+def _score(pr):
+    return pr.get("score") or 0
+
+
+def iter_by_score(prs, limit=None):
+    """
+    PR по убыванию score через кучу: heapify за O(n), дальше по O(log n) на элемент.
+    С limit — только top-K (heapq.nsmallest, O(n log K)) без полной сортировки.
+    При равном score сохраняется исходный порядок, как у устойчивой сортировки в браузере.
+    """
+    keyed = [(-_score(pr), i, pr) for i, pr in enumerate(prs)]
+    if limit is not None:
+        for _, _, pr in heapq.nsmallest(limit, keyed):
+            yield pr
+        return
+    heapq.heapify(keyed)
+    while keyed:
+        yield heapq.heappop(keyed)[2]
+
+
+def kpis(prs, thr=HIGH_THRESHOLD):
+    """То же, что metrics() в index.html."""
+    top = [e for e in prs if _score(e) >= thr]
+    problems = sum(1 for e in prs if e.get("problem") is True)
+    conc = sum(1 for e in top if e.get("problem") is True) / problems if problems else None
+    false_alarm = sum(1 for e in top if e.get("problem") is not True) / len(top) if top and problems else None
+    triage = sorted(v for v in (e.get("triage") for e in prs) if isinstance(v, (int, float)) and v > 0)
+    return {
+        "thr": thr,
+        "conc": conc,
+        "falseAlarm": false_alarm,
+        "triageMed": triage[len(triage) // 2] if triage else None,
+    }
+
+
+def histogram(values, bins=BINS):
+    """То же разбиение, что renderBars() в index.html: bins равных интервалов от min до max."""
+    if not values:
+        return None
+    mn = min(values)
+    mx = max(values)
+    w = ((mx - mn) or 1) / bins
+    counts = [0] * bins
+    for v in values:
+        counts[min(bins - 1, max(0, math.floor((v - mn) / w)))] += 1
+    return {"min": mn, "max": mx, "width": w, "counts": counts}
+
+
+def score_stats(values):
+    if not values:
+        return None
+    # медиана — как в renderBars: элемент n // 2 отсортированного списка
+    k = len(values) // 2
+    return {
+        "n": len(values),
+        "min": min(values),
+        "max": max(values),
+        "median": sorted(values)[k],
+        "avg": sum(values) / len(values),
+    }
+
+
+def write_pages(prs, out_dir, page_size=200, max_pages=None, thr=HIGH_THRESHOLD):
+    """
+    Дашборд для больших выборок: out_dir/summary.json с готовыми KPI, порогом, гистограммой
+    и статистикой score плюс страницы page-0001.json, ... по page_size PR, отсортированные по score.
+    Браузеру не нужно грузить все PR и пересчитывать метрики — достаточно сводки и первой страницы.
+    zone на страницах уже выставлена по фиксированному порогу thr, как её показывает index.html.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    limit = page_size * max_pages if max_pages else None
+    pages = []
+    page = []
+
+    def flush():
+        name = f"page-{len(pages) + 1:04d}.json"
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            json.dump({"page": len(pages) + 1, "prs": page}, f, ensure_ascii=False, separators=(",", ":"))
+        pages.append(name)
+
+    for pr in iter_by_score(prs, limit):
+        page.append(dict(pr, zone="high" if _score(pr) >= thr else "mid"))
+        if len(page) == page_size:
+            flush()
+            page = []
+    if page:
+        flush()
+    # страницы от прошлого запуска с большим числом PR больше не актуальны
+    for name in os.listdir(out_dir):
+        if name.startswith("page-") and name.endswith(".json") and name not in pages:
+            os.remove(os.path.join(out_dir, name))
+
+    scores = [_score(pr) for pr in prs]
+    summary = {
+        "n": len(prs),
+        "page_size": page_size,
+        "pages": pages,
+        "kpis": kpis(prs, thr),
+        "histogram": histogram(scores),
+        "stats": score_stats(scores),
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
@@ -1,12 +1,79 @@
 
 import json, os, sys, math, datetime, re
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from raw_store import RawStore
+from line_ranges import added_ranges
+from dashboard_pages import pages_config, write_pages
+from metrics import METRICS
+from ingest_reports import findings_stems
+import git_mining
+try:
+    import numpy as np
+except ImportError:
+    np=None
 sev_w={"Critical":1.0,"Major":0.7,"Minor":0.4,"Info":0.2}
+weights={"ci":0.25,"sa":0.25,"size":0.15,"spread":0.1,"hot":0.15,"sem":0.1}
 def load(path):
     with open(path,"r",encoding="utf-8") as f: return json.load(f)
+def iter_findings(stem):
+    # находки пишутся построчно (.ndjson) потоковым парсером либо JSON-массивом
+    if os.path.exists(stem+".ndjson"):
+        with open(stem+".ndjson","r",encoding="utf-8") as f:
+            for l in f:
+                if l.strip(): yield json.loads(l)
+    elif os.path.exists(stem+".json"):
+        yield from load(stem+".json")
+def load_findings(stem):
+    return list(iter_findings(stem))
 def norm_minmax(vals):
     if not vals: return []
     mn=min(vals); mx=max(vals)
     return [(0 if mx==mn else (v-mn)/(mx-mn)) for v in vals]
+def _score_numpy(cols, w):
+    a={k:np.asarray(v,dtype=np.float64) for k,v in cols.items()}
+    flat=set()
+    def nm(k):
+        v=a[k]
+        if not len(v): return v
+        mn=v.min(); mx=v.max()
+        if mx==mn: flat.add(k); return np.zeros_like(v)
+        return (v-mn)/(mx-mn)
+    # norm_minmax отдаёт для постоянной колонки целые 0 — повторяем, чтобы JSON совпадал
+    lst=lambda k,v: [0]*len(v) if k in flat else v.tolist()
+    ci_n=(nm("ci_fail")+nm("ci_dur"))/2
+    sa_n=nm("sa"); size_n=nm("size"); spread_n=nm("spread"); hot_n=nm("hot")
+    n=len(ci_n)
+    sec=a["sa"]>0.9*a["sa"].max() if n else np.zeros(0,bool)
+    api=~sec&(a["spread"]>0.9*a["spread"].max()) if n else np.zeros(0,bool)
+    sem=np.where(sec,0.8,np.where(api,0.6,0.0))
+    # порядок сложения тот же, что в скалярной формуле, — результат совпадает побитно
+    score=w["ci"]*ci_n+w["sa"]*sa_n+w["size"]*size_n+w["spread"]*spread_n+w["hot"]*hot_n+w["sem"]*sem
+    k=int(n*0.7)
+    q70=float(np.partition(score,k)[k]) if n else 0
+    return {"ciN":ci_n.tolist(),"saN":lst("sa",sa_n),"sizeN":lst("size",size_n),"spreadN":lst("spread",spread_n),"hotN":lst("hot",hot_n),"semN":sem.tolist(),"score":score.tolist(),
+            "semCat":np.where(sec,"Безопасность",np.where(api,"API","Общее")).tolist(),"zone":np.where(score>=q70,"high","mid").tolist()}
+def _score_python(cols, w):
+    ci_fail_n=norm_minmax(cols["ci_fail"]); ci_dur_n=norm_minmax(cols["ci_dur"]); sa_n=norm_minmax(cols["sa"]); size_n=norm_minmax(cols["size"]); spread_n=norm_minmax(cols["spread"]); hot_n=norm_minmax(cols["hot"])
+    sa_max=max(cols["sa"],default=0); spread_max=max(cols["spread"],default=0)
+    res={k:[] for k in ("ciN","saN","sizeN","spreadN","hotN","semN","score","semCat","zone")}
+    for i in range(len(ci_fail_n)):
+        ci_n=(ci_fail_n[i]+ci_dur_n[i])/2
+        sem_score=0.0
+        sem_cat="Общее"
+        if cols["sa"][i]>0.9*sa_max: sem_cat,sem_score="Безопасность",0.8
+        elif cols["spread"][i]>0.9*spread_max: sem_cat,sem_score="API",0.6
+        score=w["ci"]*ci_n+w["sa"]*sa_n[i]+w["size"]*size_n[i]+w["spread"]*spread_n[i]+w["hot"]*hot_n[i]+w["sem"]*sem_score
+        for k,v in (("ciN",ci_n),("saN",sa_n[i]),("sizeN",size_n[i]),("spreadN",spread_n[i]),("hotN",hot_n[i]),("semN",sem_score),("score",score),("semCat",sem_cat)): res[k].append(v)
+    scores=res["score"]
+    q70=sorted(scores)[int(len(scores)*0.7)] if scores else 0
+    res["zone"]=["high" if x>=q70 else "mid" for x in scores]
+    return res
+def score_columns(cols, w=weights, use_numpy=None):
+    # колоночный расчёт индекса: cols — списки признаков ci_fail, ci_dur, sa, size, spread, hot одной длины;
+    # нормирование, веса и порог q70 считаются разом по колонкам, с NumPy, если он установлен
+    if use_numpy is None: use_numpy=np is not None
+    return _score_numpy(cols, w) if use_numpy else _score_python(cols, w)
 def hot_count_for_pr(hot_map, files):
     s=0
     for f in files:
@@ -22,65 +89,123 @@ def modules_touched(files):
     return len(mods)
 def findings_for_pr(findings, pr_files_added):
     out=[]
-    file_to_lines={f["path"]:set(f.get("added_lines",[])) for f in pr_files_added}
+    file_to_lines={f["path"]:added_ranges(f) for f in pr_files_added}
     for it in findings:
         p=it.get("file")
         if p in file_to_lines:
             if it.get("line",0)==0 or it.get("line",0) in file_to_lines[p]:
                 out.append(it)
     return out
-def retro_label(pr, issues, later_commits):
-    n=pr["number"]
-    words=("revert","hotfix","fix","regression")
-    for c in later_commits:
-        msg=(c.get("message") or "").lower()
-        if any(w in msg for w in words): 
-            return True,"commit"
+def index_findings(findings):
+    # путь -> (отсортированные номера строк, позиции находок в исходном списке в том же порядке)
+    by_path={}
+    for i,it in enumerate(findings):
+        ln=it.get("line",0)
+        if type(ln) is not int: continue
+        by_path.setdefault(it.get("file"),[]).append((ln,i))
+    idx={}
+    for p,items in by_path.items():
+        items.sort()
+        idx[p]=([l for l,_ in items],[i for _,i in items])
+    return findings, idx
+def lookup_findings(index, pr_files_added):
+    # то же, что findings_for_pr, но по индексу: смотрим только файлы PR и их added_lines
+    findings,idx=index
+    file_to_lines={f["path"]:f for f in pr_files_added}
+    hit=[]
+    for p,f in file_to_lines.items():
+        ent=idx.get(p)
+        if ent is None: continue
+        lines,pos=ent
+        hit.extend(pos[bisect_left(lines,0):bisect_right(lines,0)])
+        # диапазоны добавленных строк против отсортированных строк находок — по два bisect на диапазон
+        hit.extend(pos[j] for j in added_ranges(f).select(lines) if lines[j]!=0)
+    # исходный порядок находок сохраняем: от него зависит порядок суммирования sa_raw
+    hit.sort()
+    return [findings[i] for i in hit]
+def pr_features(pr, f_all, hot):
+    # сырые признаки одного PR: общие для пакетного расчёта и онлайн-оценки (online_score)
+    files=pr["files"]
+    return {"ci_fail":pr["ci"]["failure"]/max(1,(pr["ci"]["success"]+pr["ci"]["failure"])),"ci_dur":pr["ci"]["duration_avg_sec"],
+            "sa":sum(sev_w.get(x.get("severity","Minor"),0.4) for x in f_all if x.get("is_new",True)),
+            "size":sum(f["add"]+f["del"] for f in files),"spread":modules_touched(files),"hot":hot_count_for_pr(hot, files)}
+RETRO_WORDS=("revert","hotfix","fix","regression")
+# все ключевые слова — одно регулярное выражение: один проход по тексту вместо четырёх поисков подстроки
+_retro_kw=re.compile("|".join(RETRO_WORDS))
+# "#123" как отдельная ссылка: не часть "#1234", не HTML-сущность "&#123;"
+_pr_ref=re.compile(r"(?<![\w&])#(\d+)(?!\w)")
+def retro_index(issues, commits):
+    # инвертированный индекс PR -> ссылающиеся на него тексты с ключевыми словами за один проход:
+    # {"issue": True} и/или {"commit": дата самого позднего такого коммита}; время линейно по объёму текста
+    idx={}
     for iss in issues:
-        body=(iss.get("body") or "")+" "+(iss.get("title") or "")
-        body=body.lower()
-        if f"#{n}" in body and any(w in body for w in words):
-            return True,"issue"
+        text=((iss.get("body") or "")+" "+(iss.get("title") or "")).lower()
+        if "#" not in text or not _retro_kw.search(text): continue
+        for n in set(_pr_ref.findall(text)): idx.setdefault(int(n),{})["issue"]=True
+    for c in commits:
+        msg=(c.get("message") or "").lower()
+        if "#" not in msg or not _retro_kw.search(msg): continue
+        d=c.get("date") or ""
+        for n in set(_pr_ref.findall(msg)):
+            e=idx.setdefault(int(n),{})
+            if d>e.get("commit",""): e["commit"]=d
+    return idx
+def retro_label_indexed(idx, pr):
+    # коммит считается, только если он позже слияния PR: собственные коммиты PR с "fix" не в счёт
+    e=idx.get(pr["number"])
+    if not e: return False,"none"
+    if e.get("commit","")>(pr.get("merged_at") or pr.get("created_at") or ""): return True,"commit"
+    if e.get("issue"): return True,"issue"
     return False,"none"
-def main():
-    cfg=load("config.json")
-    pr_en=load("data/raw/pr_enriched.json")
-    hot=load("data/raw/hot_files_90d.json") if os.path.exists("data/raw/hot_files_90d.json") else {}
-    det=findings_det=load("reports/detekt_findings.json") if os.path.exists("reports/detekt_findings.json") else []
-    ktl=findings_kt=load("reports/ktlint_findings.json") if os.path.exists("reports/ktlint_findings.json") else []
-    issues=load("data/raw/issues.json") if os.path.exists("data/raw/issues.json") else []
-    out=[]
-    ci_fails=[]; ci_dur=[]; sizes=[]; spreads=[]; sa_raw=[]; hots=[]
+def retro_label(pr, issues, later_commits):
+    return retro_label_indexed(retro_index(issues, later_commits), pr)
+def main(root=None):
+    # root — каталог проекта с config.json, data/ и reports/; пути из config.json считаются от него
+    j=lambda p: os.path.join(root or "",p)
+    cfg=load(j("config.json"))
+    store=RawStore.from_config(cfg,root)
+    issues=load(j("data/raw/issues.json")) if os.path.exists(j("data/raw/issues.json")) else []
+    if store is not None:
+        # PR читаются из БД по одному, находки сопоставляются запросом по индексам path/line
+        stems=findings_stems(cfg,root)
+        src=json.dumps([[p,os.path.getsize(p),os.path.getmtime(p)] for st in stems for p in (st+".ndjson",st+".json") if os.path.exists(p)])
+        store.replace_findings(chain(*map(iter_findings,stems)),src)
+        pr_en=store.iter_prs()
+        hot=store.hot_map()
+        pr_findings=lambda pr: store.findings_for_pr(pr["number"])
+    else:
+        pr_en=load(j("data/raw/pr_enriched.json"))
+        hot=load(j("data/raw/hot_files_90d.json")) if os.path.exists(j("data/raw/hot_files_90d.json")) else {}
+        findings_idx=index_findings([it for st in findings_stems(cfg,root) for it in iter_findings(st)])
+        pr_findings=lambda pr: lookup_findings(findings_idx, pr["files"])
+    out=[]; ref_commits=[]
+    cols={k:[] for k in ("ci_fail","ci_dur","sa","size","spread","hot")}
     for pr in pr_en:
-        files=pr["files"]
-        commits=pr["commits"]
-        later=[c for c in commits if True]
-        f_det=findings_for_pr(det, files)
-        f_kt=findings_for_pr(ktl, files)
-        f_all=f_det+f_kt
-        sa=sum(sev_w.get(x.get("severity","Minor"),0.4) for x in f_all if x.get("is_new",True))
-        size=sum(f["add"]+f["del"] for f in files)
-        spread=modules_touched(files)
-        hot_score=hot_count_for_pr(hot, files)
-        ci_fail_ratio=pr["ci"]["failure"]/max(1,(pr["ci"]["success"]+pr["ci"]["failure"]))
-        ci_fails.append(ci_fail_ratio); ci_dur.append(pr["ci"]["duration_avg_sec"]); sizes.append(size); spreads.append(spread); sa_raw.append(sa); hots.append(hot_score)
-        out.append({"number":pr["number"],"title":pr["title"],"files":files,"ci":pr["ci"],"size":size,"spread":spread,"sa_raw":sa,"hot":hot_score,"commits":commits,"merged_at":pr.get("merged_at"),"created_at":pr["created_at"]})
-    ci_fail_n=norm_minmax(ci_fails); ci_dur_n=norm_minmax(ci_dur); size_n=norm_minmax(sizes); spread_n=norm_minmax(spreads); sa_n=norm_minmax(sa_raw); hot_n=norm_minmax(hots)
-    weights={"ci":0.25,"sa":0.25,"size":0.15,"spread":0.1,"hot":0.15,"sem":0.1}
-    enriched=[]
-    for i,pr in enumerate(out):
-        ci_n=(ci_fail_n[i]+ci_dur_n[i])/2
-        sem_score=0.0
-        sem_cat="Общее"
-        if pr["sa_raw"]>0.9*max(sa_raw): sem_cat,sem_score="Безопасность",0.8
-        elif pr["spread"]>0.9*max(spreads): sem_cat,sem_score="API",0.6
-        score=weights["ci"]*ci_n+weights["sa"]*sa_n[i]+weights["size"]*size_n[i]+weights["spread"]*spread_n[i]+weights["hot"]*hot_n[i]+weights["sem"]*sem_score
-        enriched.append({"number":pr["number"],"title":pr["title"],"ciN":ci_n,"saN":sa_n[i],"sizeN":size_n[i],"spreadN":spread_n[i],"hotN":hot_n[i],"semN":sem_score,"score":score,"semCat":sem_cat,"sa_count":pr["sa_raw"]})
-    scores=[e["score"] for e in enriched]
-    scores_sorted=sorted(scores)
-    q70=scores_sorted[int(len(scores)*0.7)] if scores else 0
-    for e in enriched:
-        e["zone"]="high" if e["score"]>=q70 else "mid"
-    with open(cfg["output_json"],"w",encoding="utf-8") as f: json.dump({"prs":enriched},f,ensure_ascii=False,indent=2)
+        f_all=pr_findings(pr)
+        METRICS.inc("findings_matched_total",len(f_all))
+        x=pr_features(pr,f_all,hot)
+        for k,v in cols.items(): v.append(x[k])
+        # из коммитов оставляем только те, что могут ссылаться на другой PR, — для ретро-разметки
+        ref_commits.extend(c for c in pr["commits"] if "#" in (c.get("message") or ""))
+        # файлы и коммиты PR дальше не нужны — не держим их в памяти до конца цикла
+        out.append({"number":pr["number"],"title":pr["title"],"sa_raw":x["sa"],"merged_at":pr.get("merged_at"),"created_at":pr.get("created_at")})
+    if store is not None: store.close()
+    METRICS.set("prs_scored",len(out))
+    sc=score_columns(cols)
+    # с локальным клоном ссылки ищем по всей истории (revert/hotfix-коммиты вне выборки PR)
+    clone=git_mining.local_clone(cfg,root)
+    retro=retro_index(issues,chain(ref_commits,git_mining.iter_messages(clone,"--no-merges") if clone else ()))
+    labels=[retro_label_indexed(retro,pr) for pr in out]
+    METRICS.set("prs_problem_labeled",sum(1 for l,_ in labels if l))
+    enriched=[{"number":pr["number"],"title":pr["title"],"ciN":sc["ciN"][i],"saN":sc["saN"][i],"sizeN":sc["sizeN"][i],"spreadN":sc["spreadN"][i],"hotN":sc["hotN"][i],"semN":sc["semN"][i],"score":sc["score"][i],"semCat":sc["semCat"][i],"sa_count":pr["sa_raw"],"zone":sc["zone"][i],"problem":labels[i][0],"problem_src":labels[i][1]} for i,pr in enumerate(out)]
+    with open(j(cfg["output_json"]),"w",encoding="utf-8") as f: json.dump({"prs":enriched},f,ensure_ascii=False,indent=2)
+    pages=pages_config(cfg,root)
+    if pages: write_pages(enriched,**pages)
+    # каждый пакетный прогон — новая база для онлайн-оценки: точные min/max и q70 этой выборки
+    # (импорт здесь: online_stats сам импортирует этот модуль)
+    from online_stats import OnlineScorer, online_config
+    oc=online_config(cfg,root)
+    OnlineScorer.from_batch(cols,sc["score"],rebaseline_every=oc["rebaseline_every"]).save(oc["state"])
 if __name__=="__main__":
     main()
+    METRICS.write()
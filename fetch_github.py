@@ -1,22 +1,37 @@
 
-import os, sys, json, time, math, re, datetime, pathlib, requests
+import os, sys, json, math, re, datetime, pathlib, requests
+from concurrent.futures import ThreadPoolExecutor
+from http_cache import HttpCache
+from rate_limit import RateLimiter
+from raw_store import RawStore
+from line_ranges import LineRanges
+from metrics import METRICS
+import git_mining
 BASE="https://api.github.com"
 HEADERS=lambda token: {"Accept":"application/vnd.github+json","Authorization":f"Bearer {token}","X-GitHub-Api-Version":"2022-11-28"}
+SESSION=requests.Session()
+def configure_session(workers):
+    # один пул keep-alive соединений на все потоки, размер пула = числу воркеров
+    ad=requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=max(1,workers))
+    SESSION.mount("https://",ad); SESSION.mount("http://",ad)
+CACHE=None
+# общий планировщик лимитов; при пуле токенов (GITHUB_TOKENS) аргумент token ниже не используется
+LIMITER=RateLimiter([])
+def http_get(url, token, params=None):
+    def send(tok):
+        tok=tok or token
+        if CACHE is not None: return CACHE.request(SESSION.get,url,params=params,headers=HEADERS(tok),timeout=30)
+        return SESSION.get(url, headers=HEADERS(tok), params=params, timeout=30)
+    return LIMITER.send(send)
 def get(url, token, params=None):
-    r=requests.get(url, headers=HEADERS(token), params=params, timeout=30)
-    if r.status_code==403 and "rate limit" in r.text.lower():
-        time.sleep(60)
-        r=requests.get(url, headers=HEADERS(token), params=params, timeout=30)
+    r=http_get(url, token, params)
     r.raise_for_status()
     return r.json()
-def get_paged(url, token, params=None, limit=1000, list_key=None):
-    items=[]; page=1
+def iter_paged(url, token, params=None, limit=1000, list_key=None):
+    n=0; page=1
     while True:
         p=dict(params or {}); p.update({"per_page":100,"page":page})
-        r=requests.get(url, headers=HEADERS(token), params=p, timeout=30)
-        if r.status_code==403 and "rate limit" in r.text.lower():
-            time.sleep(60)
-            r=requests.get(url, headers=HEADERS(token), params=p, timeout=30)
+        r=http_get(url, token, p)
         r.raise_for_status()
         payload=r.json()
         if isinstance(payload, dict):
@@ -30,30 +45,35 @@ def get_paged(url, token, params=None, limit=1000, list_key=None):
         else:
             chunk=payload
         if not chunk: break
-        items.extend(chunk)
-        if len(chunk)<100 or len(items)>=limit: break
+        yield from chunk
+        n+=len(chunk)
+        if len(chunk)<100 or n>=limit: break
         page+=1
-    return items
+def get_paged(url, token, params=None, limit=1000, list_key=None):
+    return list(iter_paged(url, token, params, limit, list_key))
 def parse_date(s):
     return datetime.datetime.strptime(s,"%Y-%m-%dT%H:%M:%SZ")
 def read_config(path):
     with open(path,"r",encoding="utf-8") as f: return json.load(f)
 def in_range(dt, start, end):
     return dt>=start and dt<=end
-def list_prs(owner, repo, token, start, end, max_pr):
+def list_prs(owner, repo, token, start, end, max_pr, since=None):
     url=f"{BASE}/repos/{owner}/{repo}/pulls"
-    prs=[]; page=1
+    prs=[]; page=1; seen_all=False
     while True:
-        r=requests.get(url, headers=HEADERS(token), params={"state":"all","per_page":100,"page":page,"sort":"updated","direction":"desc"}, timeout=30)
+        r=http_get(url, token, {"state":"all","per_page":100,"page":page,"sort":"updated","direction":"desc"})
         r.raise_for_status()
         chunk=r.json()
         if not chunk: break
         for pr in chunk:
+            # инкрементальный режим: всё, что не обновлялось после high-water mark, уже собрано
+            if since and parse_date(pr["updated_at"])<=since:
+                seen_all=True; break
             dt=parse_date(pr["created_at"])
             if dt < start and page>3:
                 break
             prs.append(pr)
-        if len(chunk)<100 or len(prs)>=max_pr:
+        if seen_all or len(chunk)<100 or len(prs)>=max_pr:
             break
         page+=1
     filtered=[]
@@ -72,7 +92,8 @@ def list_files(owner, repo, num, token):
     out=[]
     for f in files:
         path=f["filename"]; add=f["additions"]; dele=f["deletions"]; patch=f.get("patch","")
-        hunks=[]
+        # добавленные строки копим диапазонами (start, length): подряд идущие '+' в ханке — один диапазон
+        hunks=LineRanges()
         lines=patch.splitlines()
         add_line=None
         for line in lines:
@@ -83,41 +104,106 @@ def list_files(owner, repo, num, token):
             elif line.startswith("+") and not line.startswith("++"):
                 if add_line is None: continue
                 add_line+=1
-                hunks.append(add_line)
-            elif not line.startswith("-"):
+                hunks.add(add_line)
+            elif not line.startswith("-") and not line.startswith("\\"):
+                # "\ No newline at end of file" — служебная строка patch, не строка файла
                 if add_line is not None: add_line+=1
-        out.append({"path":path,"add":add,"del":dele,"added_lines":hunks})
+        out.append({"path":path,"add":add,"del":dele,"added_ranges":hunks.to_json()})
     return out
 def list_commits(owner, repo, num, token):
     url=f"{BASE}/repos/{owner}/{repo}/pulls/{num}/commits"
     commits=get_paged(url, token, {})
     return [{"sha":c["sha"],"date":c["commit"]["author"]["date"],"message":c["commit"]["message"]} for c in commits]
-def list_actions_runs(owner, repo, token, limit=300):
+def fetch_pr_details(owner, repo, num, token):
+    return list_files(owner,repo,num,token), list_commits(owner,repo,num,token)
+def pr_details(owner, repo, pr, token, clone=None):
+    # с локальным клоном файлы и коммиты берутся из git; в API идём только за PR, которых в клоне нет
+    if clone:
+        d=git_mining.pr_details(clone,pr)
+        METRICS.inc("pr_details_total",source="git" if d is not None else "api")
+        if d is not None: return d
+    return fetch_pr_details(owner,repo,pr["number"],token)
+def run_record(r):
+    sha=r.get("head_sha")
+    status=r.get("status")
+    conclusion=r.get("conclusion")
+    dur=None
+    if r.get("run_started_at") and r.get("updated_at"):
+        try:
+            s=parse_date(r["run_started_at"]); e=parse_date(r["updated_at"]); dur=int((e-s).total_seconds())
+        except:
+            dur=None
+    pr_nums=[pr.get("number") for pr in (r.get("pull_requests") or []) if pr.get("number") is not None]
+    return {"id":r["id"],"head_sha":sha,"status":status,"conclusion":conclusion,"duration_sec":dur,"pr_numbers":pr_nums}
+def iter_actions_runs(owner, repo, token, limit=300):
     url=f"{BASE}/repos/{owner}/{repo}/actions/runs"
-    runs=get_paged(url, token, {"event":"pull_request"}, limit=limit, list_key="workflow_runs")
-    out=[]
-    for r in runs:
-        sha=r.get("head_sha")
-        status=r.get("status")
-        conclusion=r.get("conclusion")
-        dur=None
-        if r.get("run_started_at") and r.get("updated_at"):
+    for r in iter_paged(url, token, {"event":"pull_request"}, limit=limit, list_key="workflow_runs"):
+        yield run_record(r)
+def list_actions_runs(owner, repo, token, limit=300):
+    return list(iter_actions_runs(owner, repo, token, limit))
+def iter_json_array(path, chunk=1<<16):
+    # читает JSON-массив объектов по одному элементу, не загружая файл целиком
+    dec=json.JSONDecoder()
+    with open(path,"r",encoding="utf-8") as f:
+        buf=f.read(chunk).lstrip(); pos=1 if buf.startswith("[") else 0
+        while True:
+            while pos<len(buf) and buf[pos] in " \t\r\n,": pos+=1
+            if pos<len(buf) and buf[pos]=="]": return
             try:
-                s=parse_date(r["run_started_at"]); e=parse_date(r["updated_at"]); dur=int((e-s).total_seconds())
-            except:
-                dur=None
-        pr_nums=[pr.get("number") for pr in (r.get("pull_requests") or []) if pr.get("number") is not None]
-        out.append({"id":r["id"],"head_sha":sha,"status":status,"conclusion":conclusion,"duration_sec":dur,"pr_numbers":pr_nums})
-    return out
-def aggregate_ci_for_pr(runs, pr_commits):
-    shas=set([c["sha"] for c in pr_commits])
-    rel=[r for r in runs if (r["head_sha"] in shas) or (len(r["pr_numbers"])>0)]
-    if not rel: return {"success":0,"failure":0,"duration_avg_sec":0}
-    succ=sum(1 for r in rel if r["conclusion"]=="success")
-    fail=sum(1 for r in rel if r["conclusion"] in ["failure","timed_out","cancelled"])
+                obj,pos=dec.raw_decode(buf,pos)
+            except ValueError:
+                more=f.read(chunk)
+                if not more:
+                    if buf[pos:].strip(): raise
+                    return
+                buf=buf[pos:]+more; pos=0
+                continue
+            yield obj
+            if pos>chunk: buf=buf[pos:]; pos=0
+def tee_json_array(items, f):
+    f.write("[")
+    for i,it in enumerate(items):
+        f.write(("," if i else "")+"\n"+json.dumps(it,ensure_ascii=False))
+        yield it
+    f.write("\n]")
+def ci_summary(succ, fail, dur_sum, dur_n):
+    return {"success":succ,"failure":fail,"duration_avg_sec":int(dur_sum/dur_n) if dur_n else 0}
+def index_runs(runs):
+    by_sha={}; by_pr={}
+    for r in runs:
+        by_sha.setdefault(r["head_sha"],[]).append(r)
+        for n in r["pr_numbers"]: by_pr.setdefault(n,[]).append(r)
+    return {"by_sha":by_sha,"by_pr":by_pr}
+def aggregate_ci_for_pr(runs_idx, pr_commits, pr_number=None):
+    # прогоны PR: по sha его коммитов и по номеру PR в pull_requests, каждый прогон один раз
+    rel={}
+    for c in pr_commits:
+        for r in runs_idx["by_sha"].get(c["sha"],()): rel[r["id"]]=r
+    for r in runs_idx["by_pr"].get(pr_number,()): rel[r["id"]]=r
+    rel=rel.values()
     durs=[r["duration_sec"] for r in rel if r["duration_sec"]]
-    davg=int(sum(durs)/len(durs)) if durs else 0
-    return {"success":succ,"failure":fail,"duration_avg_sec":davg}
+    return ci_summary(sum(1 for r in rel if r["conclusion"]=="success"),sum(1 for r in rel if r["conclusion"] in ["failure","timed_out","cancelled"]),sum(durs),len(durs))
+def aggregate_ci_stream(runs, commits_by_pr):
+    # тот же результат, что aggregate_ci_for_pr для каждого PR, но за один проход по потоку прогонов:
+    # в памяти только счётчики по PR, а не список прогонов
+    by_sha={}
+    for num,commits in commits_by_pr.items():
+        for c in commits: by_sha.setdefault(c["sha"],set()).add(num)
+    acc={num:[0,0,0,0] for num in commits_by_pr}
+    # страницы /actions/runs сдвигаются, если во время обхода появились новые прогоны: повтор прогона не считаем
+    seen=set()
+    for r in runs:
+        if r["id"] in seen: continue
+        seen.add(r["id"])
+        nums=by_sha.get(r["head_sha"],set())|{n for n in r["pr_numbers"] if n in acc}
+        for n in nums:
+            a=acc[n]
+            if r["conclusion"]=="success": a[0]+=1
+            elif r["conclusion"] in ["failure","timed_out","cancelled"]: a[1]+=1
+            if r["duration_sec"]: a[2]+=r["duration_sec"]; a[3]+=1
+    return {num:ci_summary(*a) for num,a in acc.items()}
+def aggregate_ci_file(path, commits_by_pr):
+    return aggregate_ci_stream(iter_json_array(path), commits_by_pr)
 def compute_hot(files_history, cutoff_days=90):
     now=datetime.datetime.utcnow()
     cutoff=now-datetime.timedelta(days=cutoff_days)
@@ -128,31 +214,108 @@ def compute_hot(files_history, cutoff_days=90):
         for p in it["paths"]:
             cnt[p]=cnt.get(p,0)+1
     return cnt
-def main():
-    cfg=read_config("config.json")
+STATE_PATH="data/raw/fetch_state.json"
+def load_json(path, default):
+    if not os.path.exists(path): return default
+    with open(path,"r",encoding="utf-8") as f: return json.load(f)
+def merge_by_number(old, new):
+    nums=set(x["number"] for x in new)
+    return list(new)+[x for x in old if x["number"] not in nums]
+def files_history(records):
+    return [{"date":c["date"],"paths":[f["path"] for f in r["files"]]} for r in records for c in r["commits"]]
+def hot_days(files_history, sign=1, days=None):
+    # счётчики горячести по дням: позволяют вычесть старую версию PR и добавить новую
+    days={} if days is None else days
+    for it in files_history:
+        b=days.setdefault(it["date"][:10],{})
+        for p in it["paths"]:
+            b[p]=b.get(p,0)+sign
+            if b[p]<=0: del b[p]
+    return days
+def hot_from_days(days, cutoff_days=90):
+    cutoff=(datetime.datetime.now(datetime.timezone.utc)-datetime.timedelta(days=cutoff_days)).strftime("%Y-%m-%d")
+    for d in [d for d in days if d<cutoff]: del days[d]
+    cnt={}
+    for b in days.values():
+        for p,n in b.items():
+            cnt[p]=cnt.get(p,0)+n
+    return cnt
+def main(root=None):
+    global CACHE, LIMITER
+    # root — каталог проекта с config.json и data/; пути передаются явно, текущий каталог процесса не важен
+    j=lambda p: os.path.join(root or "",p)
+    cfg=read_config(j("config.json"))
+    LIMITER=RateLimiter.from_env(cfg,name="fetch_github")
     token=os.getenv("GITHUB_TOKEN","").strip()
-    if not token: 
+    if not LIMITER.has_token:
         print("GITHUB_TOKEN not set"); sys.exit(1)
     owner,repo=cfg["repo"].split("/")
     start=datetime.datetime.strptime(cfg["date_from"],"%Y-%m-%d")
     end=datetime.datetime.strptime(cfg["date_to"],"%Y-%m-%d")+datetime.timedelta(days=1)-datetime.timedelta(seconds=1)
-    os.makedirs("data/raw",exist_ok=True)
-    prs=list_prs(owner,repo,token,start,end,cfg.get("max_pr",200))
-    with open("data/raw/pr_list.json","w",encoding="utf-8") as f: json.dump(prs,f,ensure_ascii=False,indent=2)
-    runs=list_actions_runs(owner,repo,token,limit=300)
-    with open("data/raw/ci_runs.json","w",encoding="utf-8") as f: json.dump(runs,f,ensure_ascii=False,indent=2)
-    files_hist=[]
+    workers=max(1,int(cfg.get("fetch_workers",8)))
+    configure_session(workers)
+    CACHE=HttpCache.from_config(cfg,root)
+    os.makedirs(j("data/raw"),exist_ok=True)
+    prev_state=load_json(j(STATE_PATH),{})
+    state=prev_state if cfg.get("incremental") else {}
+    clone=git_mining.local_clone(cfg,root)
+    since=parse_date(state["updated_at"]) if state.get("updated_at") else None
+    # в инкрементальном режиме max_pr не обрезает дельту, иначе часть обновлений потерялась бы за high-water mark
+    prs=list_prs(owner,repo,token,start,end,cfg.get("max_pr",200) if since is None else 10**9,since=since)
+    store=RawStore.from_config(cfg,root)
+    if store is None:
+        pr_list=merge_by_number(load_json(j("data/raw/pr_list.json"),[]),prs) if since else prs
+        with open(j("data/raw/pr_list.json"),"w",encoding="utf-8") as f: json.dump(pr_list,f,ensure_ascii=False,indent=2)
+    elif since is None:
+        store.reset()
+    METRICS.set("fetch_prs_delta",len(prs),client="fetch_github")
     out=[]
-    for pr in prs:
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        details=list(ex.map(lambda pr: pr_details(owner,repo,pr,token,clone), prs))
+    # прогоны CI пишем в ci_runs.json и агрегируем по PR на лету, не держа весь список в памяти
+    commits_by_pr={pr["number"]:commits for pr,(files,commits) in zip(prs,details)}
+    runs=iter_actions_runs(owner,repo,token,limit=int(cfg.get("ci_runs_limit",300)))
+    if store is not None:
+        ci_by_pr=aggregate_ci_stream(store.tee_runs(runs),commits_by_pr)
+    else:
+        with open(j("data/raw/ci_runs.json"),"w",encoding="utf-8") as f:
+            ci_by_pr=aggregate_ci_stream(tee_json_array(runs,f),commits_by_pr)
+    for pr,(files,commits) in zip(prs,details):
         num=pr["number"]
-        files=list_files(owner,repo,num,token)
-        commits=list_commits(owner,repo,num,token)
-        ci=aggregate_ci_for_pr(runs, commits)
+        ci=ci_by_pr[num]
         out.append({"number":num,"title":pr["title"],"merged_at":pr.get("merged_at"),"created_at":pr["created_at"],"files":files,"commits":commits,"ci":ci})
-        for c in commits:
-            files_hist.append({"date":c["date"],"paths":[f["path"] for f in files]})
-    with open("data/raw/pr_enriched.json","w",encoding="utf-8") as f: json.dump(out,f,ensure_ascii=False,indent=2)
-    hot=compute_hot(files_hist,90)
-    with open("data/raw/hot_files_90d.json","w",encoding="utf-8") as f: json.dump(hot,f,ensure_ascii=False,indent=2)
+    git_state={}
+    if clone:
+        # горячесть — по всем коммитам клона за 90 дней, дочитываем только новые после прошлого HEAD
+        gdays,ghead=git_mining.hot_days_since(clone,prev_state.get("git_head"),prev_state.get("git_days"),90)
+        hot=hot_from_days(gdays,90)
+        git_state={"git_head":ghead,"git_days":gdays}
+        days=None
+    if since:
+        # из БД читаем только прежние версии обновлённых PR, а не всю историю
+        prev=None if store is not None else load_json(j("data/raw/pr_enriched.json"),[])
+        if not clone:
+            replaced=store.get_prs([x["number"] for x in out]) if store is not None else [x for x in prev if x["number"] in {y["number"] for y in out}]
+            days=state.get("hot_days")
+            if days is None: days=hot_days(files_history(store.iter_prs() if store is not None else prev))
+            # горячесть пересчитываем только по дельте: минус прежние версии обновлённых PR, плюс новые
+            hot_days(files_history(replaced),-1,days)
+            hot_days(files_history(out),1,days)
+            hot=hot_from_days(days,90)
+        if store is None: out=merge_by_number(prev,out)
+    elif not clone:
+        days=hot_days(files_history(out))
+        hot=compute_hot(files_history(out),90)
+    if store is not None:
+        store.upsert_prs(out); store.set_hot(hot); store.close()
+    else:
+        with open(j("data/raw/pr_enriched.json"),"w",encoding="utf-8") as f: json.dump(out,f,ensure_ascii=False,indent=2)
+        with open(j("data/raw/hot_files_90d.json"),"w",encoding="utf-8") as f: json.dump(hot,f,ensure_ascii=False,indent=2)
+    hwm=max([pr["updated_at"] for pr in prs]+([state["updated_at"]] if state.get("updated_at") else []),default=None)
+    with open(j(STATE_PATH),"w",encoding="utf-8") as f: json.dump({"updated_at":hwm,"hot_days":days,**git_state},f,ensure_ascii=False)
+    if CACHE is not None:
+        CACHE.prune(); CACHE.report()
+    LIMITER.report()
 if __name__=="__main__":
     main()
+    METRICS.write()
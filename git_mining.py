@@ -0,0 +1,190 @@
+import datetime
+import os
+import re
+import subprocess
+
+from line_ranges import LineRanges
+from metrics import METRICS
+
+HUNK = re.compile(r"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# \0 в начале — граница коммита в выводе git log --numstat
+LOG_FORMAT = "%x00%H%x1f%ad%x1f%s"
+DATE_FORMAT = "format-local:%Y-%m-%dT%H:%M:%SZ"
+
+
+def local_clone(cfg, root=None):
+    """
+    Путь к локальному клону из "local_clone" config.json (относительно каталога проекта root);
+    None — файлы и коммиты PR берутся из API.
+    """
+    path = cfg.get("local_clone")
+    return os.path.abspath(os.path.join(root or "", path)) if path else None
+
+
+def _cmd(repo, args):
+    return ["git", "-C", repo, "-c", "core.quotePath=false", *args]
+
+
+def _env():
+    # даты в UTC в том же формате, что у GitHub API (fetch_github.parse_date)
+    return dict(os.environ, TZ="UTC", LC_ALL="C")
+
+
+def git(repo, *args):
+    return subprocess.run(_cmd(repo, args), capture_output=True, text=True, check=True, env=_env()).stdout
+
+
+def iter_git(repo, *args):
+    """Вывод git построчно, не собирая его целиком: история большого репозитория — сотни мегабайт."""
+    with subprocess.Popen(_cmd(repo, args), stdout=subprocess.PIPE, text=True, encoding="utf-8",
+                          errors="replace", env=_env()) as p:
+        for line in p.stdout:
+            yield line.rstrip("\n")
+        p.stdout.close()
+        if p.wait():
+            raise subprocess.CalledProcessError(p.returncode, p.args)
+
+
+def has_commit(repo, sha):
+    if not sha:
+        return False
+    r = subprocess.run(_cmd(repo, ["cat-file", "-e", f"{sha}^{{commit}}"]), capture_output=True, env=_env())
+    return r.returncode == 0
+
+
+def head(repo):
+    return git(repo, "rev-parse", "HEAD").strip()
+
+
+def iter_log(repo, *rev_args):
+    """Коммиты с numstat: {"sha", "date", "message", "files": [(path, add, del), ...]}."""
+    METRICS.inc("git_commands_total", command="log")
+    cur = None
+    for line in iter_git(repo, "log", "--no-renames", "--numstat", f"--date={DATE_FORMAT}", f"--format={LOG_FORMAT}", *rev_args):
+        if line.startswith("\0"):
+            if cur is not None:
+                yield cur
+            sha, date, msg = line[1:].split("\x1f", 2)
+            cur = {"sha": sha, "date": date, "message": msg, "files": []}
+        elif line and cur is not None:
+            add, dele, path = line.split("\t", 2)
+            # бинарные файлы в numstat — "-": GitHub для них тоже отдаёт 0
+            cur["files"].append((path, int(add) if add != "-" else 0, int(dele) if dele != "-" else 0))
+    if cur is not None:
+        yield cur
+
+
+def iter_messages(repo, *rev_args):
+    """Только заголовки коммитов без numstat: {"sha", "date", "message"} — для поиска ссылок на PR."""
+    METRICS.inc("git_commands_total", command="log")
+    for line in iter_git(repo, "log", f"--date={DATE_FORMAT}", "--format=%H%x1f%ad%x1f%s", *rev_args):
+        sha, date, msg = line.split("\x1f", 2)
+        yield {"sha": sha, "date": date, "message": msg}
+
+
+def _header_path(line):
+    # "+++ b/sp ace.kt\t": к пути с пробелом git дописывает табуляцию
+    return line[6:].rstrip("\t")
+
+
+def diff_files(repo, base, tip):
+    """
+    Изменённые файлы base..tip в формате записей pr_enriched: add/del и added_ranges.
+    С -U0 заголовок ханка "+c,d" — ровно добавленные строки c..c+d-1, без разбора тела патча.
+    """
+    METRICS.inc("git_commands_total", command="diff")
+    out = []
+    cur = None
+    # заголовок файла — от "diff --git" до первого "@@": внутри ханка "+++ ..." — добавленная строка "++ ..."
+    header = False
+    for line in iter_git(repo, "diff", "-U0", "--no-renames", "--no-color", "--no-ext-diff",
+                         "--src-prefix=a/", "--dst-prefix=b/", base, tip):
+        if line.startswith("diff --git "):
+            cur = {"path": None, "add": 0, "del": 0, "ranges": LineRanges()}
+            out.append(cur)
+            header = True
+        elif cur is None:
+            continue
+        elif header and line.startswith("--- ") and cur["path"] is None:
+            if line != "--- /dev/null":
+                cur["path"] = _header_path(line)
+        elif header and line.startswith("+++ "):
+            # у удалённого файла "+++ /dev/null" — путь остаётся из "--- a/..."
+            if line != "+++ /dev/null":
+                cur["path"] = _header_path(line)
+        elif line.startswith("@@"):
+            header = False
+            m = HUNK.match(line)
+            if m:
+                removed = int(m.group(1) if m.group(1) is not None else 1)
+                start = int(m.group(2))
+                added = int(m.group(3) if m.group(3) is not None else 1)
+                cur["del"] += removed
+                cur["add"] += added
+                if added:
+                    cur["ranges"].add_range(start, added)
+        elif line.startswith("Binary files ") and cur["path"] is None:
+            m = re.match(r"Binary files (?:a/(.*)|/dev/null) and (?:b/(.*)|/dev/null) differ", line)
+            if m:
+                cur["path"] = m.group(2) or m.group(1)
+    return [{"path": f["path"], "add": f["add"], "del": f["del"], "added_ranges": f["ranges"].to_json()} for f in out if f["path"]]
+
+
+def _commits(repo, *rev_args):
+    return [{"sha": c["sha"], "date": c["date"], "message": c["message"]} for c in iter_log(repo, "--no-merges", *rev_args)]
+
+
+def pr_details(repo, pr):
+    """
+    Файлы и коммиты PR из локального клона — замена fetch_github.fetch_pr_details без запросов к API.
+    Слитый merge-коммитом PR: diff первого родителя merge_commit_sha, коммиты — до второго родителя.
+    Squash/rebase и открытый PR: merge-base базы и head.sha .. head.sha — как список файлов в API;
+    у rebase-слияния merge_commit_sha — только последний из перенесённых коммитов.
+    None, если нужных коммитов в клоне нет (не сделан fetch или ветка форка).
+    """
+    merge = pr.get("merge_commit_sha")
+    if pr.get("merged_at") and has_commit(repo, merge):
+        parents = git(repo, "rev-list", "--parents", "-n", "1", merge).split()[1:]
+        if len(parents) > 1:
+            return diff_files(repo, parents[0], merge), _commits(repo, f"{parents[0]}..{parents[1]}")
+    tip = (pr.get("head") or {}).get("sha")
+    base = (pr.get("base") or {}).get("sha")
+    if has_commit(repo, tip) and has_commit(repo, base):
+        fork = git(repo, "merge-base", base, tip).strip()
+        return diff_files(repo, fork, tip), _commits(repo, f"{fork}..{tip}")
+    return None
+
+
+def hot_days_since(repo, last_head=None, days=None, cutoff_days=90):
+    """
+    Счётчики горячести по дням (формат fetch_github.hot_days) по коммитам клона: каждый коммит —
+    +1 каждому изменённому им файлу. С last_head из прошлого запуска читаются только новые коммиты
+    last_head..HEAD; если last_head пропал из истории (force push, новый клон) — полный проход за cutoff_days.
+    Дни старше cutoff_days отбрасываются: состояние не растёт вместе с историей клона.
+    Возвращает (days, HEAD).
+    """
+    since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=cutoff_days)).strftime("%Y-%m-%d")
+    tip = head(repo)
+    if last_head == tip and days is not None:
+        return _trim_days(days, since), tip
+    incremental = days is not None and has_commit(repo, last_head) and \
+        subprocess.run(_cmd(repo, ["merge-base", "--is-ancestor", last_head, tip]), env=_env()).returncode == 0
+    if incremental:
+        rev = [f"{last_head}..{tip}"]
+    else:
+        days = {}
+        rev = [f"--since={since}", tip]
+    n = 0
+    for c in iter_log(repo, "--no-merges", *rev):
+        b = days.setdefault(c["date"][:10], {})
+        for path, _, _ in c["files"]:
+            b[path] = b.get(path, 0) + 1
+        n += 1
+    METRICS.set("git_commits_scanned", n)
+    return _trim_days(days, since), tip
+
+
+def _trim_days(days, since):
+    for d in [d for d in days if d < since]:
+        del days[d]
+    return days
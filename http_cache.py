@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from metrics import METRICS
+
+# *.tmp моложе этого срока может дописывать другой процесс или поток — prune их не удаляет
+TMP_MAX_AGE = 3600
+
+
+class CachedResponse:
+    """
+    Ответ, восстановленный из кэша после 304 Not Modified.
+    Повторяет ту часть интерфейса requests.Response, которой пользуются сборщики.
+    """
+
+    status_code = 200
+
+    def __init__(self, entry, live_headers=None):
+        self.text = entry["body"]
+        # заголовки лимитов берём из живого 304-ответа, остальные — из кэша
+        self.headers = dict(entry.get("headers") or {})
+        self.headers.update({k: v for k, v in (live_headers or {}).items() if k.lower().startswith("x-ratelimit")})
+        self.url = entry["url"]
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        pass
+
+
+class HttpCache:
+    """
+    Дисковый кэш GET-запросов к GitHub с условными запросами (ETag / Last-Modified).
+    Ключ — URL + параметры. Ответ 304 не расходует лимит API, тело отдаём с диска.
+    Вытеснение: записи, не подтверждённые дольше max_age_days, удаляются, затем самые давно использованные —
+    пока суммарный размер не уложится в max_mb.
+    """
+
+    def __init__(self, path="data/cache/http", max_mb=200, max_age_days=14):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, cfg, root=None):
+        c = cfg.get("http_cache") or {}
+        if c.get("enabled", True) is False:
+            return None
+        return cls(os.path.join(root or "", c.get("dir", "data/cache/http")), c.get("max_mb", 200), c.get("max_age_days", 14))
+
+    def key(self, url, params=None):
+        raw = url + "?" + json.dumps(params or {}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".json")
+
+    def load(self, key):
+        fn = self._file(key)
+        try:
+            # возраст считаем от последней успешной валидации (mtime обновляется на 304)
+            if time.time() - os.path.getmtime(fn) > self.max_age:
+                return None
+            with open(fn, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, url, r):
+        etag = r.headers.get("ETag")
+        modified = r.headers.get("Last-Modified")
+        if not etag and not modified:
+            return
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": modified,
+            "stored_at": time.time(),
+            "headers": {k: v for k, v in r.headers.items() if k.lower() in ("link", "content-type")},
+            "body": r.text,
+        }
+        fn = self._file(key)
+        tmp = f"{fn}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, fn)
+
+    def request(self, get, url, params=None, headers=None, timeout=30):
+        """
+        Выполняет GET через переданную функцию (requests.get или Session.get),
+        добавляя If-None-Match / If-Modified-Since, если ответ уже есть в кэше.
+        """
+        key = self.key(url, params)
+        entry = self.load(key)
+        h = dict(headers or {})
+        if entry:
+            if entry.get("etag"):
+                h["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                h["If-Modified-Since"] = entry["last_modified"]
+        r = get(url, params=params, headers=h, timeout=timeout)
+        if r.status_code == 304 and entry:
+            with self._lock:
+                self.hits += 1
+            METRICS.inc("http_cache_total", result="hit")
+            # отмечаем использование — по mtime работают LRU- и возрастное вытеснение
+            try:
+                os.utime(self._file(key))
+            except OSError:
+                pass
+            return CachedResponse(entry, r.headers)
+        with self._lock:
+            self.misses += 1
+        METRICS.inc("http_cache_total", result="miss")
+        if r.status_code == 200:
+            self.store(key, url, r)
+        return r
+
+    def prune(self):
+        """
+        Удаляет устаревшие записи, затем самые старые по использованию сверх лимита размера.
+        Каталог может делить другой сборщик, который пишет в него прямо сейчас: его *.tmp
+        не трогаем, пока они моложе TMP_MAX_AGE, а файлы, удалённые им самим, пропускаем.
+        """
+        now = time.time()
+        files = []
+        for name in os.listdir(self.path):
+            fn = os.path.join(self.path, name)
+            try:
+                st = os.stat(fn)
+                if name.endswith(".tmp"):
+                    # недописанный файл упавшего процесса; свежий — чужая запись в процессе
+                    if now - st.st_mtime > TMP_MAX_AGE:
+                        os.remove(fn)
+                    continue
+                if now - st.st_mtime > self.max_age:
+                    os.remove(fn)
+                    continue
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, fn))
+        total = sum(s for _, s, _ in files)
+        for _, size, fn in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(fn)
+            except OSError:
+                pass
+            total -= size
+
+    def report(self, label="http cache"):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        print(f"{label}: hits={self.hits} misses={self.misses} hit_rate={rate:.0%}")
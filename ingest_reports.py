@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urlparse
+
+import parse_detekt
+from metrics import METRICS
+
+EXTENSIONS = (".xml", ".json", ".jsonl", ".ndjson", ".sarif")
+FINDINGS_STEMS = ("reports/detekt_findings", "reports/ktlint_findings")
+
+
+def findings_stems(cfg, root=None):
+    """
+    Файлы находок для extract_features: "findings" в config.json — пути без расширения (.ndjson или .json)
+    относительно каталога проекта root.
+    """
+    return tuple(os.path.join(root or "", st) for st in cfg.get("findings") or FINDINGS_STEMS)
+
+
+def repo_path(name, root=None):
+    """
+    Путь из отчёта -> путь в репозитории, как у GitHub: file:// URI и обратные слэши
+    приводятся к обычному виду, префикс root (каталог проекта на машине, где шёл анализ) отрезается.
+    """
+    if name.startswith("file:"):
+        name = unquote(urlparse(name).path)
+        # file:///C:/code/... -> /C:/code/...
+        if len(name) > 2 and name[0] == "/" and name[2] == ":":
+            name = name[1:]
+    name = name.replace("\\", "/")
+    if root:
+        prefix = root.replace("\\", "/").rstrip("/") + "/"
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+
+def detect_format(path):
+    """
+    Формат отчёта по началу файла: "checkstyle" (detekt, ktlint --reporter=checkstyle и др.),
+    "baseline" (detekt SmellBaseline), "sarif", "ktlint_json" (массив {"file", "errors"}),
+    "jsonl" (по находке на строку, вход parse_ktlint). None — не отчёт линтера.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        head = f.read(4096)
+    s = head.lstrip("\ufeff \t\r\n")
+    if s.startswith("<"):
+        if "<checkstyle" in head:
+            return "checkstyle"
+        if "<SmellBaseline" in head:
+            return "baseline"
+        return None
+    if s.startswith("["):
+        # любой JSON-массив в каталоге — ещё не отчёт: первым элементом должен быть объект с "file"
+        first = s[1:].lstrip()
+        return "ktlint_json" if first.startswith("{") and '"file"' in first else None
+    if s.startswith("{"):
+        if '"runs"' in head or "sarif" in head[:300]:
+            return "sarif"
+        first = s.split("\n", 1)[0]
+        try:
+            obj = json.loads(first)
+        except ValueError:
+            return None
+        return "jsonl" if isinstance(obj, dict) and "file" in obj else None
+    return None
+
+
+def _tool(rule, default):
+    if not rule:
+        return default
+    if rule.startswith("detekt."):
+        return "detekt"
+    if rule.startswith(("standard:", "ktlint")) or ":" in rule:
+        return "ktlint"
+    return default
+
+
+def _item(tool, rule, severity, file, line, rid=None):
+    return {"tool": tool, "rule": rule, "severity": severity, "file": file, "line": line, "rid": rid or f"{file}:{rule}:{line}"}
+
+
+def iter_checkstyle(path, root=None):
+    # тот же потоковый разбор, что в parse_detekt; инструмент — по префиксу правила (detekt.*, standard:*)
+    for it in parse_detekt.iter_detekt_xml(path):
+        name = repo_path(it["file"], root)
+        rid = it["rid"] if not it["rid"].startswith(it["file"] + ":") else None
+        yield _item(_tool(it["rule"], "checkstyle"), it["rule"], it["severity"], name, it["line"], rid)
+
+
+def _json_arrays(path):
+    # run_ktlint.sh склеивает отчёты модулей: несколько JSON-массивов подряд в одном файле
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    dec = json.JSONDecoder()
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos] in "\ufeff \t\r\n":
+            pos += 1
+        if pos >= len(text):
+            return
+        data, pos = dec.raw_decode(text, pos)
+        yield from (data if isinstance(data, list) else [data])
+
+
+def iter_ktlint_json(path, root=None):
+    for entry in _json_arrays(path):
+        if "errors" not in entry:
+            # массив уже плоских находок
+            yield _item(entry.get("tool", "ktlint"), entry.get("rule") or entry.get("ruleId") or "ktlint",
+                        (entry.get("severity") or "Minor").title(), repo_path(entry.get("file", ""), root), entry.get("line", 0))
+            continue
+        name = repo_path(entry.get("file", ""), root)
+        for e in entry["errors"]:
+            yield _item("ktlint", e.get("rule") or "ktlint", (e.get("severity") or "Error").title(), name, e.get("line", 0))
+
+
+def iter_jsonl(path, root=None):
+    # формат parse_ktlint: битые строки пропускаются, как там
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                continue
+            rule = obj.get("rule") or obj.get("ruleId") or "ktlint"
+            yield _item("ktlint", rule, (obj.get("severity") or "Minor").title(), repo_path(obj.get("file", ""), root), obj.get("line", 0))
+
+
+def iter_sarif(path, root=None):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    for run in data.get("runs", []):
+        name = ((run.get("tool") or {}).get("driver") or {}).get("name", "sarif").lower()
+        tool = "detekt" if "detekt" in name else "ktlint" if "ktlint" in name else name
+        for res in run.get("results", []):
+            rule = res.get("ruleId") or tool
+            severity = (res.get("level") or "warning").title()
+            locs = res.get("locations") or [{}]
+            phys = locs[0].get("physicalLocation") or {}
+            uri = (phys.get("artifactLocation") or {}).get("uri", "")
+            line = (phys.get("region") or {}).get("startLine", 0)
+            if tool == "detekt" and not rule.startswith("detekt."):
+                # SARIF detekt: "style/MagicNumber" — в checkstyle то же правило "detekt.MagicNumber"
+                rule = "detekt." + rule.rsplit("/", 1)[-1]
+            yield _item(tool, rule, severity, repo_path(uri, root), line)
+
+
+PARSERS = {"checkstyle": iter_checkstyle, "ktlint_json": iter_ktlint_json, "jsonl": iter_jsonl, "sarif": iter_sarif}
+
+
+def discover(directory):
+    """Отчёты в дереве directory: (путь, формат), по пути. Выходы самого конвейера (*_findings.*) пропускаются."""
+    out = []
+    for d, dirs, files in os.walk(directory):
+        dirs[:] = sorted(x for x in dirs if not x.startswith("."))
+        for name in sorted(files):
+            if not name.endswith(EXTENSIONS) or "_findings." in name or name.startswith("findings."):
+                continue
+            path = os.path.join(d, name)
+            fmt = detect_format(path)
+            if fmt is not None:
+                out.append((path, fmt))
+    return out
+
+
+def parse_report(path, fmt, root=None):
+    """Все находки одного отчёта (выполняется в процессе пула)."""
+    if fmt == "baseline":
+        return sorted(parse_detekt.load_baseline(path))
+    return list(PARSERS[fmt](path, root))
+
+
+def _parse_safe(path, fmt, root=None):
+    # (находки, None) или (None, ошибка): один битый или чужой файл не должен обрывать разбор остальных
+    try:
+        return parse_report(path, fmt, root), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def ingest(reports, root=None, workers=None):
+    """
+    Разбор отчётов в пуле процессов и слияние по rid: одна и та же находка из отчётов модуля
+    и агрегированного отчёта учитывается один раз (по первому отчёту, где она встретилась).
+    Baseline detekt из того же набора отмечает is_new.
+    Порядок — по пути отчёта и порядку внутри него, независимо от того, какой процесс закончил раньше.
+    Отчёт, который не удалось разобрать, пропускается с предупреждением.
+    """
+    if len(reports) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_parse_safe, [p for p, _ in reports], [f for _, f in reports], [root] * len(reports)))
+    else:
+        results = [_parse_safe(p, f, root) for p, f in reports]
+    for (path, fmt), (_, err) in zip(reports, results):
+        if err is not None:
+            print(f"{path}: skipped, cannot parse as {fmt}: {err}", file=sys.stderr)
+            METRICS.inc("report_errors_total", format=fmt)
+    reports = [r for r, (_, err) in zip(reports, results) if err is None]
+    parsed = [items for items, err in results if err is None]
+    baseline = set()
+    for (_, fmt), items in zip(reports, parsed):
+        if fmt == "baseline":
+            baseline.update(items)
+    # rid -> номер отчёта: повтор rid внутри одного отчёта — разные колонки одной строки, это разные находки
+    seen = {}
+    out = []
+    dup = 0
+    for i, ((path, fmt), items) in enumerate(zip(reports, parsed)):
+        if fmt == "baseline":
+            continue
+        METRICS.inc("report_findings_total", len(items), format=fmt)
+        for it in items:
+            if seen.setdefault(it["rid"], i) != i:
+                dup += 1
+                continue
+            it["is_new"] = it["tool"] != "detekt" or it["rid"] not in baseline
+            out.append(it)
+    METRICS.inc("report_findings_duplicates_total", dup)
+    return out, dup
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*", default=["reports"])  # каталоги (ищутся рекурсивно) и/или файлы отчётов
+    ap.add_argument("--out", default="reports/findings.ndjson")
+    ap.add_argument("--root", default=None)  # каталог проекта в путях отчётов, например C:/code/kotlinpoet
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+    reports = []
+    for p in args.paths:
+        if os.path.isdir(p):
+            reports.extend(discover(p))
+        elif os.path.exists(p):
+            fmt = detect_format(p)
+            if fmt is None:
+                print(f"{p}: unknown report format", file=sys.stderr)
+            else:
+                reports.append((p, fmt))
+    out_abs = os.path.abspath(args.out)
+    reports = [(p, f) for p, f in reports if os.path.abspath(p) != out_abs]
+    for p, f in reports:
+        print(f"{p}: {f}")
+    findings, dup = ingest(reports, args.root, args.workers)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    parse_detekt.write_findings(findings, args.out)
+    print(f"{args.out}: {len(findings)} findings from {len(reports)} reports ({dup} duplicates)")
+
+
+if __name__ == "__main__":
+    main()
+    METRICS.write()
@@ -0,0 +1,83 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class LineRanges:
+    """
+    Отсортированные непересекающиеся диапазоны номеров строк (start, length) в двух array('l').
+    Заменяет поштучный список added_lines: массовая правка на десятки тысяч строк
+    в одном ханке — это одна пара чисел, а не десятки тысяч int в list/set.
+    """
+
+    __slots__ = ("starts", "lengths")
+
+    def __init__(self):
+        self.starts = array("l")
+        self.lengths = array("l")
+
+    @classmethod
+    def from_lines(cls, lines):
+        r = cls()
+        for ln in sorted(set(lines)):
+            r.add(ln)
+        return r
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        r = cls()
+        for start, length in sorted(pairs):
+            r.add_range(start, length)
+        return r
+
+    def add(self, line):
+        self.add_range(line, 1)
+
+    def add_range(self, start, length):
+        # строки приходят по возрастанию (ханки патча, отсортированный ввод) — сливаем с последним диапазоном
+        if length <= 0:
+            return
+        if self.starts:
+            last = len(self.starts) - 1
+            end = self.starts[last] + self.lengths[last]
+            if start <= end:
+                self.lengths[last] = max(end, start + length) - self.starts[last]
+                return
+        self.starts.append(start)
+        self.lengths.append(length)
+
+    def __contains__(self, line):
+        i = bisect_right(self.starts, line) - 1
+        return i >= 0 and line < self.starts[i] + self.lengths[i]
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def __iter__(self):
+        for s, n in zip(self.starts, self.lengths):
+            yield from range(s, s + n)
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def pairs(self):
+        return list(zip(self.starts, self.lengths))
+
+    def select(self, lines):
+        """Индексы j отсортированного списка lines, для которых lines[j] попадает в диапазоны."""
+        out = []
+        for s, n in zip(self.starts, self.lengths):
+            out.extend(range(bisect_left(lines, s), bisect_left(lines, s + n)))
+        return out
+
+    def to_json(self):
+        return [[s, n] for s, n in zip(self.starts, self.lengths)]
+
+
+def added_ranges(file_rec):
+    """
+    Добавленные строки файла PR как LineRanges: новый формат "added_ranges" ([[start, length], ...])
+    или прежний поштучный "added_lines" из старых pr_enriched.json.
+    """
+    if "added_ranges" in file_rec:
+        return LineRanges.from_pairs(file_rec["added_ranges"])
+    return LineRanges.from_lines(file_rec.get("added_lines", []))
@@ -0,0 +1,148 @@
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "pr_risk_"
+# границы корзин гистограмм по умолчанию — секунды: от быстрых HTTP-запросов до долгих шагов конвейера
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Metrics:
+    """
+    Общий реестр метрик процесса: счётчики (inc), значения (set) и гистограммы (observe) с метками.
+    Потокобезопасен — им пользуются пулы fetch_github и enrich_semantics.
+    write() сохраняет снимок в metrics.json и в текстовый файл для node_exporter textfile collector.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        k = self._key(name, labels)
+        with self._lock:
+            self.counters[k] = self.counters.get(k, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, buckets=BUCKETS, **labels):
+        k = self._key(name, labels)
+        with self._lock:
+            h = self.histograms.get(k)
+            if h is None:
+                h = self.histograms[k] = {"buckets": list(buckets), "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+            i = 0
+            while i < len(h["buckets"]) and value > h["buckets"][i]:
+                i += 1
+            h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        def rows(d, conv=lambda v: v):
+            return [{"name": n, "labels": dict(lb), "value": conv(v)} for (n, lb), v in sorted(d.items())]
+        with self._lock:
+            return {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "counters": rows(self.counters),
+                "gauges": rows(self.gauges),
+                "histograms": rows(self.histograms, lambda h: dict(h, counts=list(h["counts"]))),
+            }
+
+    def prometheus(self):
+        def fmt(name, labels, extra=()):
+            lb = list(labels) + list(extra)
+            if not lb:
+                return PREFIX + name
+            return PREFIX + name + "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in lb) + "}"
+        out = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                out.append(f"# TYPE {PREFIX}{name} {kind}")
+        with self._lock:
+            for (n, lb), v in sorted(self.counters.items()):
+                header(n, "counter")
+                out.append(f"{fmt(n, lb)} {v}")
+            for (n, lb), v in sorted(self.gauges.items()):
+                header(n, "gauge")
+                out.append(f"{fmt(n, lb)} {v}")
+            for (n, lb), h in sorted(self.histograms.items()):
+                header(n, "histogram")
+                acc = 0
+                for b, c in zip(h["buckets"], h["counts"]):
+                    acc += c
+                    out.append(f"{fmt(n + '_bucket', lb, [('le', b)])} {acc}")
+                out.append(f"{fmt(n + '_bucket', lb, [('le', '+Inf')])} {h['count']}")
+                out.append(f"{fmt(n + '_sum', lb)} {h['sum']}")
+                out.append(f"{fmt(n + '_count', lb)} {h['count']}")
+        return "\n".join(out) + "\n"
+
+    def write(self, out_dir="data/derived"):
+        """out_dir/metrics.json и out_dir/metrics.prom (атомарная замена — collector не увидит половину файла)."""
+        os.makedirs(out_dir, exist_ok=True)
+        for name, text in (("metrics.json", json.dumps(self.snapshot(), ensure_ascii=False, indent=2)),
+                           ("metrics.prom", self.prometheus())):
+            path = os.path.join(out_dir, name)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def endpoint(url):
+    """Шаблон эндпоинта для меток: /repos/{repo}/pulls/{n}/files — без владельца, номеров и query."""
+    path = re.sub(r"^https?://[^/]+", "", url or "").split("?", 1)[0]
+    path = re.sub(r"^/repos/[^/]+/[^/]+", "/repos/{repo}", path)
+    return re.sub(r"/\d+(?=/|$)", "/{n}", path) or "/"
+
+
+@contextmanager
+def profiled(name, out_dir=None):
+    """С out_dir — cProfile блока в out_dir/<name>.prof (pstats/snakeviz); без него — ничего не делает."""
+    if not out_dir:
+        yield
+        return
+    os.makedirs(out_dir, exist_ok=True)
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(os.path.join(out_dir, f"{name}.prof"))
+
+
+METRICS = Metrics()
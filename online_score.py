@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import sys
+
+import extract_features as ef
+import fetch_github as fg
+from ingest_reports import findings_stems
+from online_stats import OnlineScorer, online_config
+from raw_store import RawStore
+
+
+class PrContext:
+    """
+    Всё, что нужно для признаков PR помимо него самого: горячесть файлов и индекс находок.
+    Загружается один раз — в сервисе держится в памяти между запросами.
+    """
+
+    def __init__(self, cfg, root=None):
+        store = RawStore.from_config(cfg, root)
+        if store is not None:
+            self.hot = store.hot_map()
+            store.close()
+        else:
+            hot = os.path.join(root or "", "data/raw/hot_files_90d.json")
+            self.hot = ef.load(hot) if os.path.exists(hot) else {}
+        self.findings = ef.index_findings([it for st in findings_stems(cfg, root) for it in ef.iter_findings(st)])
+
+    def features(self, pr):
+        return ef.pr_features(pr, ef.lookup_findings(self.findings, pr["files"]), self.hot)
+
+
+def setup_fetch(cfg, name):
+    """Лимитер и сессия fetch_github для запросов вне его main; False — токена нет."""
+    fg.LIMITER = fg.RateLimiter.from_env(cfg, name=name)
+    fg.configure_session(4)
+    return fg.LIMITER.has_token
+
+
+def fetch_record(owner, repo, num, token):
+    """Запись PR в формате pr_enriched: файлы, коммиты и CI по прогонам Actions его коммитов."""
+    pr = fg.get(f"https://api.github.com/repos/{owner}/{repo}/pulls/{num}", token)
+    files, commits = fg.fetch_pr_details(owner, repo, num, token)
+    # те же прогоны, что видит пакетный aggregate_ci_for_pr: event=pull_request, по всем коммитам PR
+    runs = []
+    for c in commits:
+        runs.extend(fg.run_record(r) for r in fg.iter_paged(
+            f"https://api.github.com/repos/{owner}/{repo}/actions/runs", token,
+            {"head_sha": c["sha"], "event": "pull_request"}, list_key="workflow_runs"))
+    ci = fg.aggregate_ci_for_pr(fg.index_runs(runs), commits, num)
+    return {"number": num, "title": pr["title"], "merged_at": pr.get("merged_at"), "created_at": pr["created_at"],
+            "files": files, "commits": commits, "ci": ci}
+
+
+def score_pr(pr, scorer, ctx, update=True):
+    raw = ctx.features(pr)
+    return dict({"number": pr["number"], "title": pr["title"]}, **scorer.score(raw, update), sa_count=raw["sa"])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pr", type=int, required=True)
+    ap.add_argument("--dry_run", action="store_true")  # не обновлять статистику и не сохранять состояние
+    args = ap.parse_args(argv)
+    cfg = fg.read_config("config.json")
+    oc = online_config(cfg)
+    scorer = OnlineScorer.load(oc["state"])
+    if scorer is None:
+        sys.exit(f"{oc['state']} not found: run extract_features first")
+    if not setup_fetch(cfg, "online_score"):
+        sys.exit("GITHUB_TOKEN not set")
+    owner, repo = cfg["repo"].split("/")
+    pr = fetch_record(owner, repo, args.pr, os.getenv("GITHUB_TOKEN", "").strip())
+    res = score_pr(pr, scorer, PrContext(cfg), update=not args.dry_run)
+    if not args.dry_run:
+        scorer.save(oc["state"])
+    if scorer.needs_rebaseline:
+        print(f"{scorer.updates} online updates since {scorer.baseline_at}: rerun extract_features to rebaseline", file=sys.stderr)
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
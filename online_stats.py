@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from bisect import bisect_right, insort
+
+import extract_features as ef
+
+FEATURES = ("ci_fail", "ci_dur", "sa", "size", "spread", "hot")
+STATE_PATH = "data/derived/online_state.json"
+
+
+def online_config(cfg, root=None):
+    """Секция "online_scoring" config.json: {"state", "rebaseline_every"}; state — относительно каталога проекта root."""
+    c = cfg.get("online_scoring") or {}
+    return {"state": os.path.join(root or "", c.get("state", STATE_PATH)), "rebaseline_every": int(c.get("rebaseline_every", 500))}
+
+
+class P2Quantile:
+    """
+    Потоковая оценка квантиля p алгоритмом P² (Jain, Chlamtac): пять маркеров, O(1) памяти
+    и времени на значение. Пока значений меньше пяти — точный квантиль, как sorted(x)[int(n*p)].
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.q = []
+        self.n = [1, 2, 3, 4, 5]
+        self.want = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.step = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q = self.q
+        if len(q) < 5:
+            insort(q, x)
+            return
+        if x < q[0]:
+            q[0] = x
+        elif x > q[4]:
+            q[4] = x
+        k = min(3, max(0, bisect_right(q, x) - 1))
+        for i in range(k + 1, 5):
+            self.n[i] += 1
+        for i in range(5):
+            self.want[i] += self.step[i]
+        n = self.n
+        for i in (1, 2, 3):
+            d = self.want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        if not self.q:
+            return 0
+        if self.count <= 5:
+            return self.q[int(len(self.q) * self.p)]
+        return self.q[2]
+
+    def to_dict(self):
+        return {"p": self.p, "count": self.count, "q": self.q, "n": self.n, "want": self.want}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["p"])
+        s.count = d["count"]
+        s.q = list(d["q"])
+        s.n = list(d["n"])
+        s.want = list(d["want"])
+        return s
+
+
+class OnlineScorer:
+    """
+    Оценка одного PR без пересчёта всей выборки: бегущие min/max признаков вместо norm_minmax
+    по колонке и P²-оценка квантиля score вместо сортировки для порога зоны.
+    Базу задаёт пакетный прогон (from_batch в extract_features): min/max и точный q70 совпадают
+    с dashboard.json. Новые PR расширяют min/max и добавляются в P²; после rebaseline_every
+    обновлений needs_rebaseline сигнализирует, что пора пересчитать базу полным прогоном.
+    Оценки ранее посчитанных PR при расширении min/max не пересчитываются.
+    """
+
+    def __init__(self, q=0.7, weights=ef.weights, rebaseline_every=500):
+        self.q = q
+        self.weights = dict(weights)
+        self.rebaseline_every = rebaseline_every
+        self.mins = {}
+        self.maxs = {}
+        self.sketch = P2Quantile(q)
+        self.q_base = 0
+        self.n_base = 0
+        self.updates = 0
+        self.baseline_at = None
+
+    @classmethod
+    def from_batch(cls, cols, scores, q=0.7, weights=ef.weights, rebaseline_every=500):
+        s = cls(q, weights, rebaseline_every)
+        for k in FEATURES:
+            if cols[k]:
+                s.mins[k] = min(cols[k])
+                s.maxs[k] = max(cols[k])
+        for v in scores:
+            s.sketch.add(v)
+        # тот же порог, что в score_columns: элемент int(n*q) отсортированных score
+        s.q_base = sorted(scores)[int(len(scores) * q)] if scores else 0
+        s.n_base = len(scores)
+        s.baseline_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        return s
+
+    @property
+    def threshold(self):
+        return self.sketch.value() if self.updates else self.q_base
+
+    @property
+    def needs_rebaseline(self):
+        return self.updates >= self.rebaseline_every
+
+    def _norm(self, k, v):
+        mn = self.mins.get(k, v)
+        mx = self.maxs.get(k, v)
+        if mx == mn:
+            return 0
+        return min(1.0, max(0.0, (v - mn) / (mx - mn)))
+
+    def score(self, raw, update=True):
+        """
+        raw — сырые признаки PR (ef.pr_features). С update=True PR входит в статистику:
+        min/max расширяются до его значений, score попадает в оценку квантиля.
+        Формула та же, что в score_columns, порядок сложения тоже.
+        """
+        if update:
+            for k in FEATURES:
+                v = raw[k]
+                self.mins[k] = min(self.mins.get(k, v), v)
+                self.maxs[k] = max(self.maxs.get(k, v), v)
+        w = self.weights
+        ci_n = (self._norm("ci_fail", raw["ci_fail"]) + self._norm("ci_dur", raw["ci_dur"])) / 2
+        sa_n = self._norm("sa", raw["sa"])
+        size_n = self._norm("size", raw["size"])
+        spread_n = self._norm("spread", raw["spread"])
+        hot_n = self._norm("hot", raw["hot"])
+        sem_cat, sem = "Общее", 0.0
+        if raw["sa"] > 0.9 * self.maxs.get("sa", raw["sa"]):
+            sem_cat, sem = "Безопасность", 0.8
+        elif raw["spread"] > 0.9 * self.maxs.get("spread", raw["spread"]):
+            sem_cat, sem = "API", 0.6
+        score = w["ci"] * ci_n + w["sa"] * sa_n + w["size"] * size_n + w["spread"] * spread_n + w["hot"] * hot_n + w["sem"] * sem
+        if update:
+            self.sketch.add(score)
+            self.updates += 1
+        return {
+            "ciN": ci_n, "saN": sa_n, "sizeN": size_n, "spreadN": spread_n, "hotN": hot_n, "semN": sem,
+            "score": score, "semCat": sem_cat, "zone": "high" if score >= self.threshold else "mid",
+        }
+
+    def to_dict(self):
+        return {
+            "q": self.q, "weights": self.weights, "rebaseline_every": self.rebaseline_every,
+            "mins": self.mins, "maxs": self.maxs, "sketch": self.sketch.to_dict(),
+            "q_base": self.q_base, "n_base": self.n_base, "updates": self.updates, "baseline_at": self.baseline_at,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["q"], d["weights"], d.get("rebaseline_every", 500))
+        s.mins = d["mins"]
+        s.maxs = d["maxs"]
+        s.sketch = P2Quantile.from_dict(d["sketch"])
+        s.q_base = d["q_base"]
+        s.n_base = d["n_base"]
+        s.updates = d["updates"]
+        s.baseline_at = d.get("baseline_at")
+        return s
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -1,12 +1,17 @@
-
 import json, sys, os, xml.etree.ElementTree as ET
 def load_baseline(path):
     if not os.path.exists(path): return set()
-    root=ET.parse(path).getroot()
     res=set()
-    for i in root.findall(".//ID"):
-        res.add(i.text.strip() if i.text else "")
+    for _,el in ET.iterparse(path):
+        if el.tag=="ID": res.add(el.text.strip() if el.text else "")
+        el.clear()
     return res
+def finding(name, err):
+    rule=err.get("source") or err.get("rule")
+    severity=err.get("severity","Minor").title()
+    line=int(err.get("line","0"))
+    rid=err.get("id") or f"{name}:{rule}:{line}"
+    return {"tool":"detekt","rule":rule,"severity":severity,"file":name,"line":line,"rid":rid}
 def parse_detekt_xml(path):
     if not os.path.exists(path): return []
     tree=ET.parse(path); root=tree.getroot()
@@ -14,20 +19,39 @@ def parse_detekt_xml(path):
     for f in root.findall(".//file"):
         name=f.get("name")
         for err in f.findall("error"):
-            rule=err.get("source") or err.get("rule")
-            severity=err.get("severity","Minor").title()
-            line=int(err.get("line","0"))
-            rid=err.get("id") or f"{name}:{rule}:{line}"
-            out.append({"tool":"detekt","rule":rule,"severity":severity,"file":name,"line":line,"rid":rid})
+            out.append(finding(name, err))
     return out
+def iter_detekt_xml(path):
+    # потоковый разбор: каждый закрытый элемент сразу отцепляется от родителя,
+    # так что в памяти живёт только текущая цепочка file/error, а не всё дерево
+    if not os.path.exists(path): return
+    stack=[]
+    for ev,el in ET.iterparse(path, events=("start","end")):
+        if ev=="start":
+            stack.append(el); continue
+        stack.pop()
+        parent=stack[-1] if stack else None
+        if el.tag=="error" and parent is not None and parent.tag=="file":
+            yield finding(parent.get("name"), el)
+        if parent is not None: parent.remove(el)
+def write_findings(findings, out_path):
+    # .ndjson/.jsonl — по объекту на строку, иначе JSON-массив; оба пишутся по мере разбора
+    with open(out_path,"w",encoding="utf-8") as f:
+        if out_path.endswith((".ndjson",".jsonl")):
+            for it in findings: f.write(json.dumps(it,ensure_ascii=False)+"\n")
+            return
+        f.write("[")
+        for i,it in enumerate(findings): f.write(("," if i else "")+"\n"+json.dumps(it,ensure_ascii=False))
+        f.write("\n]")
 def main():
     detekt=sys.argv[1]
     baseline=sys.argv[2]
     out_path=sys.argv[3]
     bl=load_baseline(baseline)
-    findings=parse_detekt_xml(detekt)
-    for it in findings:
-        it["is_new"]=it["rid"] not in bl
-    with open(out_path,"w",encoding="utf-8") as f: json.dump(findings,f,ensure_ascii=False,indent=2)
+    def marked():
+        for it in iter_detekt_xml(detekt):
+            it["is_new"]=it["rid"] not in bl
+            yield it
+    write_findings(marked(), out_path)
 if __name__=="__main__":
     main()
@@ -1,10 +1,7 @@
 
 import json, sys, os
-def main():
-    inp=sys.argv[1]; outp=sys.argv[2]
-    if not os.path.exists(inp):
-        with open(outp,"w",encoding="utf-8") as f: json.dump([],f)
-        return
+from ingest_reports import detect_format, parse_report, repo_path
+def parse_lines(inp,root=None):
     arr=[]
     with open(inp,"r",encoding="utf-8") as f:
         for line in f:
@@ -14,9 +11,33 @@ def main():
                 obj=json.loads(line)
                 rule=obj.get("rule") or obj.get("ruleId") or "ktlint"
                 severity=(obj.get("severity") or "Minor").title()
-                arr.append({"tool":"ktlint","rule":rule,"severity":severity,"file":obj.get("file",""),"line":obj.get("line",0),"rid":f"{obj.get('file','')}:{rule}:{obj.get('line',0)}","is_new":True})
+                name=repo_path(obj.get("file",""),root)
+                arr.append({"tool":"ktlint","rule":rule,"severity":severity,"file":name,"line":obj.get("line",0),"rid":f"{name}:{rule}:{obj.get('line',0)}","is_new":True})
             except:
                 continue
-    with open(outp,"w",encoding="utf-8") as f: json.dump(arr,f,ensure_ascii=False,indent=2)
+    return arr
+def write(outp,arr):
+    # через временный файл: при ошибке разбора не остаётся обрезанного ktlint_findings.json
+    tmp=outp+".tmp"
+    with open(tmp,"w",encoding="utf-8") as f: json.dump(arr,f,ensure_ascii=False,indent=2)
+    os.replace(tmp,outp)
+def main():
+    inp=sys.argv[1]; outp=sys.argv[2]
+    # ktlint пишет абсолютные пути: префикс каталога проекта (run_ktlint.sh запускает из корня репозитория) отрезается
+    root=sys.argv[3] if len(sys.argv)>3 else os.getcwd()
+    if not os.path.exists(inp):
+        write(outp,[])
+        return
+    fmt=detect_format(inp)
+    if fmt not in (None,"jsonl","baseline"):
+        # checkstyle XML (ktlint --reporter=checkstyle), JSON-отчёт ktlint или SARIF — общим разбором ingest_reports
+        try:
+            arr=[dict(it,is_new=True) for it in parse_report(inp,fmt,root)]
+        except Exception as e:
+            print(f"{inp}: cannot parse as {fmt}: {type(e).__name__}: {e}",file=sys.stderr)
+            arr=parse_lines(inp,root)
+        write(outp,arr)
+        return
+    write(outp,parse_lines(inp,root))
 if __name__=="__main__":
     main()
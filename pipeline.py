@@ -0,0 +1,124 @@
+import hashlib
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from metrics import METRICS, profiled
+
+
+class Stage:
+    """
+    Шаг конвейера: функция без аргументов, зависимости по именам шагов,
+    входные и выходные файлы. По хэшу входов (содержимое файлов + params) шаг
+    пропускается, если с прошлого успешного запуска ничего не изменилось и выходы на месте.
+    max_age — для шагов, чьи данные живут в сети (GitHub): пропуск не дольше этого срока.
+    """
+
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), params=None, max_age=None):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.inputs = tuple(Path(p) for p in inputs)
+        self.outputs = tuple(Path(p) for p in outputs)
+        self.params = params or {}
+        self.max_age = max_age
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha256(json.dumps(self.params, sort_keys=True, default=str).encode("utf-8"))
+        for p in self.inputs:
+            h.update(str(p).encode("utf-8"))
+            h.update(file_digest(p).encode("utf-8"))
+        return h.hexdigest()
+
+    def is_fresh(self, prev: dict | None, fp: str) -> bool:
+        if not prev or prev.get("inputs") != fp:
+            return False
+        if not all(p.exists() for p in self.outputs):
+            return False
+        return self.max_age is None or time.time() - prev.get("at", 0) < self.max_age
+
+
+def file_digest(path: Path) -> str:
+    if not path.exists():
+        return "-"
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _call(stage: Stage, profile_dir=None):
+    t0 = time.time()
+    try:
+        # до 3.12 cProfile видит только поток шага; запросы из внутренних пулов сборщиков видны по метрикам http_*
+        with profiled(stage.name, profile_dir):
+            stage.run()
+    except SystemExit as e:
+        METRICS.inc("stage_runs_total", stage=stage.name, result="failed")
+        # скрипты при ошибке конфигурации делают sys.exit — в пуле это не должно гасить процесс
+        raise RuntimeError(f"stage {stage.name} exited with {e.code}") from e
+    except Exception:
+        METRICS.inc("stage_runs_total", stage=stage.name, result="failed")
+        raise
+    dt = time.time() - t0
+    METRICS.inc("stage_runs_total", stage=stage.name, result="ran")
+    METRICS.set("stage_duration_seconds", round(dt, 3), stage=stage.name)
+    return dt
+
+
+def run_stages(stages: list[Stage], state_path: Path, workers: int = 4, force=(), profile_dir=None) -> dict:
+    """
+    Выполняет граф шагов: готовые к запуску (все зависимости завершены) идут параллельно в пуле потоков.
+    Отпечатки входов сохраняются в state_path после каждого успешного шага.
+    С profile_dir каждый выполненный шаг пишет cProfile в profile_dir/<шаг>.prof; шаги тогда идут по одному:
+    активным может быть только один профилировщик (с 3.12 второй enable() падает с ValueError),
+    а профиль одного шага не должен вбирать в себя соседние.
+    Возвращает {имя шага: "skipped" | длительность в секундах}.
+    """
+    if profile_dir:
+        workers = 1
+    by_name = {s.name: s for s in stages}
+    state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+    pending = dict(by_name)
+    done: set[str] = set()
+    ran: set[str] = set()
+    result: dict = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        running = {}
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for name, s in list(pending.items()):
+                    if not all(d in done for d in s.deps if d in by_name):
+                        continue
+                    del pending[name]
+                    progressed = True
+                    fp = s.fingerprint()
+                    # перезапуск зависимости в этом прогоне делает шаг устаревшим, даже если входы совпали:
+                    # так enrich_with_llm снова перепишет dashboard.json поверх свежего extract_features
+                    upstream_ran = any(d in ran for d in s.deps)
+                    if name not in force and not upstream_ran and s.is_fresh(state.get(name), fp):
+                        done.add(name)
+                        result[name] = "skipped"
+                        METRICS.inc("stage_runs_total", stage=name, result="skipped")
+                        print(f"[pipeline] {name}: inputs unchanged, skipped")
+                        continue
+                    running[ex.submit(_call, s, profile_dir)] = (name, fp)
+            if not running:
+                if pending:
+                    raise RuntimeError(f"unresolvable stage dependencies: {sorted(pending)}")
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name, fp = running.pop(fut)
+                result[name] = fut.result()
+                done.add(name)
+                ran.add(name)
+                print(f"[pipeline] {name}: done in {result[name]:.1f}s")
+                state[name] = {"inputs": fp, "at": time.time()}
+                state_path.parent.mkdir(parents=True, exist_ok=True)
+                state_path.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    return result
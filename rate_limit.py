@@ -0,0 +1,229 @@
+import os
+import random
+import re
+import threading
+import time
+
+from metrics import METRICS, endpoint
+
+# Общий планировщик, у которого лимитеры сборщиков берут разрешения на запрос, так что бюджет токенов один.
+# В пакетном режиме (batch.py) — прокси на RateLimiter в процессе multiprocessing-менеджера;
+# иначе from_env заводит его в этом процессе (шаги конвейера запускают сборщики в параллельных потоках).
+SHARED = None
+_shared_lock = threading.Lock()
+
+
+class _Token:
+    """Состояние лимита одного токена по заголовкам последнего ответа."""
+
+    def __init__(self, value):
+        self.value = value
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0
+        self.not_before = 0.0
+        self.last = 0.0
+
+    def ready_at(self, now):
+        t = max(now, self.not_before)
+        if self.remaining is None or self.reset <= now:
+            return t
+        if self.remaining <= 0:
+            return max(t, self.reset + 1)
+        # при малом остатке растягиваем его равномерно до конца окна, а не выжигаем залпом
+        if self.limit and self.remaining < self.limit * 0.2:
+            return max(t, self.last + (self.reset - now) / self.remaining)
+        return t
+
+
+class RateLimiter:
+    """
+    Общий планировщик запросов к GitHub API для всех сборщиков.
+    - token bucket: не больше max_rate запросов в секунду (с запасом burst) на весь процесс;
+    - учитывает X-RateLimit-Remaining/Reset каждого токена и Retry-After вторичных лимитов;
+    - повторяет 403/429/5xx и сетевые ошибки с экспоненциальной задержкой и джиттером;
+    - при нескольких токенах (GITHUB_TOKENS) отправляет запрос тем, что освободится раньше.
+    Потокобезопасен: один экземпляр делят воркеры пула. Если задан SHARED, очередь и состояние
+    токенов ведёт общий лимитер, а этот только повторяет запросы и собирает метрики.
+    """
+
+    def __init__(self, tokens, max_rate=15.0, burst=20, max_retries=6, base_delay=1.0, max_delay=900.0, name="github"):
+        self.tokens = [_Token(t) for t in tokens] or [_Token(None)]
+        self.name = name  # метка client в метриках: какой сборщик делает запросы
+        self.rate = float(max_rate)
+        self.capacity = float(burst)
+        self.level = float(burst)
+        self.stamp = time.time()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.retries = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+        self.shared = SHARED
+
+    @classmethod
+    def from_env(cls, cfg=None, name="github"):
+        """
+        Токены из GITHUB_TOKENS (через запятую или пробел) и GITHUB_TOKEN, без повторов.
+        Параметры пейсинга — из секции rate_limit конфигурации.
+        """
+        process_shared(cfg)
+        return cls(env_tokens(), name=name, **((cfg or {}).get("rate_limit") or {}))
+
+    @property
+    def has_token(self):
+        return any(t.value for t in self.tokens)
+
+    def backoff(self, attempt):
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def acquire_index(self):
+        """Разрешение на один запрос: номер токена в списке (для вызова через прокси менеджера)."""
+        return self.tokens.index(self._acquire())
+
+    def observe(self, idx, limit, remaining, reset):
+        tok = self.tokens[idx]
+        with self._lock:
+            tok.limit = limit if limit is not None else tok.limit
+            tok.remaining = remaining if remaining is not None else tok.remaining
+            tok.reset = reset or tok.reset
+
+    def defer(self, idx, until):
+        with self._lock:
+            self.tokens[idx].not_before = max(self.tokens[idx].not_before, until)
+
+    def _acquire(self):
+        if self.shared is not None:
+            # токены во всех процессах одни и те же (из окружения), поэтому номер совпадает
+            t0 = time.time()
+            tok = self.tokens[self.shared.acquire_index()]
+            wait = time.time() - t0
+            with self._lock:
+                tok.last = time.time()
+                self.requests += 1
+                self.waited += wait
+            METRICS.inc("ratelimit_wait_seconds_total", wait, client=self.name)
+            return tok
+        while True:
+            with self._lock:
+                now = time.time()
+                self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+                self.stamp = now
+                tok = min(self.tokens, key=lambda t: t.ready_at(now))
+                wait = tok.ready_at(now) - now
+                if self.level < 1:
+                    wait = max(wait, (1 - self.level) / self.rate)
+                if wait <= 0:
+                    self.level -= 1
+                    tok.last = now
+                    if tok.remaining is not None:
+                        tok.remaining -= 1
+                    self.requests += 1
+                    return tok
+            time.sleep(min(wait, 60))
+            with self._lock:
+                self.waited += min(wait, 60)
+            METRICS.inc("ratelimit_wait_seconds_total", min(wait, 60), client=self.name)
+
+    def _update(self, tok, r):
+        h = r.headers
+        with self._lock:
+            if h.get("X-RateLimit-Limit"):
+                tok.limit = int(h["X-RateLimit-Limit"])
+            if h.get("X-RateLimit-Remaining"):
+                tok.remaining = int(h["X-RateLimit-Remaining"])
+            if h.get("X-RateLimit-Reset"):
+                tok.reset = float(h["X-RateLimit-Reset"])
+            remaining = tok.remaining
+            idx = self.tokens.index(tok)
+        if self.shared is not None:
+            self.shared.observe(idx, tok.limit, tok.remaining, tok.reset)
+        if remaining is not None:
+            METRICS.set("github_ratelimit_remaining", remaining, client=self.name, token=idx)
+
+    def _limited(self, r):
+        if r.status_code == 429:
+            return True
+        if r.status_code != 403:
+            return False
+        return (
+            "rate limit" in r.text.lower()
+            or r.headers.get("X-RateLimit-Remaining") == "0"
+            or r.headers.get("Retry-After") is not None
+        )
+
+    def _observe(self, r, seconds):
+        ep = endpoint(getattr(r, "url", ""))
+        METRICS.inc("http_requests_total", client=self.name, endpoint=ep, status=r.status_code)
+        METRICS.observe("http_request_seconds", seconds, client=self.name, endpoint=ep)
+        # ответ из кэша (после 304) не качался заново — у CachedResponse нет content
+        METRICS.inc("http_response_bytes_total", len(getattr(r, "content", b"") or b""), client=self.name, endpoint=ep)
+
+    def send(self, fn):
+        """
+        Вызывает fn(token) -> response с учётом лимитов и повторов.
+        Последний ответ возвращается как есть: raise_for_status остаётся за вызывающим кодом.
+        """
+        r = None
+        for attempt in range(self.max_retries + 1):
+            tok = self._acquire()
+            t0 = time.perf_counter()
+            try:
+                r = fn(tok.value)
+            except OSError:
+                # requests.RequestException наследуется от OSError: обрыв, таймаут, сброс соединения
+                METRICS.inc("http_errors_total", client=self.name)
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                METRICS.inc("http_retries_total", client=self.name, reason="network")
+                time.sleep(self.backoff(attempt))
+                continue
+            self._observe(r, time.perf_counter() - t0)
+            self._update(tok, r)
+            if self._limited(r):
+                self.retries += 1
+                METRICS.inc("http_retries_total", client=self.name, reason="rate_limited")
+                retry_after = r.headers.get("Retry-After")
+                with self._lock:
+                    if retry_after:
+                        tok.not_before = time.time() + float(retry_after)
+                    elif tok.remaining != 0 or tok.reset <= time.time():
+                        tok.not_before = time.time() + self.backoff(attempt)
+                if self.shared is not None:
+                    # Retry-After вторичного лимита касается всех процессов, работающих этим токеном
+                    self.shared.defer(self.tokens.index(tok), tok.not_before)
+                continue
+            if r.status_code in (500, 502, 503, 504):
+                self.retries += 1
+                METRICS.inc("http_retries_total", client=self.name, reason="server_error")
+                time.sleep(self.backoff(attempt))
+                continue
+            return r
+        return r
+
+    def report(self, label="rate limit"):
+        left = ",".join(str(t.remaining) for t in self.tokens if t.remaining is not None) or "n/a"
+        print(f"{label}: requests={self.requests} retries={self.retries} waited={self.waited:.0f}s remaining={left}")
+
+
+def env_tokens():
+    raw = os.getenv("GITHUB_TOKENS", "") + " " + os.getenv("GITHUB_TOKEN", "")
+    return list(dict.fromkeys(t for t in re.split(r"[\s,]+", raw) if t))
+
+
+def process_shared(cfg=None, name="shared"):
+    """
+    Общий планировщик процесса для лимитеров сборщиков (секция rate_limit из cfg). Заводится первым
+    from_env и живёт между запусками (токены сохраняют остаток и Reset); пересоздаётся, если сменились токены.
+    Прокси пакетного режима не трогает; в процессе-менеджере batch.py это и есть общий лимитер.
+    """
+    global SHARED
+    tokens = env_tokens()
+    with _shared_lock:
+        if SHARED is None or (isinstance(SHARED, RateLimiter) and [t.value for t in SHARED.tokens] != (tokens or [None])):
+            SHARED = None
+            SHARED = RateLimiter(tokens, name=name, **((cfg or {}).get("rate_limit") or {}))
+        return SHARED
@@ -0,0 +1,244 @@
+import os
+import sqlite3
+import threading
+
+from line_ranges import added_ranges
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prs (
+    number INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    title TEXT,
+    merged_at TEXT,
+    created_at TEXT,
+    ci_success INTEGER,
+    ci_failure INTEGER,
+    ci_duration_avg_sec INTEGER
+);
+CREATE INDEX IF NOT EXISTS prs_seq ON prs(seq);
+CREATE TABLE IF NOT EXISTS files (
+    pr_number INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    additions INTEGER,
+    deletions INTEGER,
+    PRIMARY KEY (pr_number, pos)
+);
+CREATE INDEX IF NOT EXISTS files_path ON files(path);
+CREATE TABLE IF NOT EXISTS added_ranges (
+    pr_number INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (pr_number, path, start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS commits (
+    pr_number INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    sha TEXT NOT NULL,
+    date TEXT,
+    message TEXT,
+    PRIMARY KEY (pr_number, pos)
+);
+CREATE INDEX IF NOT EXISTS commits_sha ON commits(sha);
+CREATE TABLE IF NOT EXISTS ci_runs (
+    id INTEGER PRIMARY KEY,
+    head_sha TEXT,
+    status TEXT,
+    conclusion TEXT,
+    duration_sec INTEGER
+);
+CREATE INDEX IF NOT EXISTS ci_runs_sha ON ci_runs(head_sha);
+CREATE TABLE IF NOT EXISTS ci_run_prs (
+    run_id INTEGER NOT NULL,
+    pr_number INTEGER NOT NULL,
+    PRIMARY KEY (run_id, pr_number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ci_run_prs_pr ON ci_run_prs(pr_number);
+CREATE TABLE IF NOT EXISTS hot_files (
+    path TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY,
+    tool TEXT,
+    rule TEXT,
+    severity TEXT,
+    file TEXT,
+    line INTEGER,
+    rid TEXT,
+    is_new INTEGER
+);
+CREATE INDEX IF NOT EXISTS findings_file_line ON findings(file, line);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class RawStore:
+    """
+    SQLite-хранилище сырых данных вместо data/raw/*.json: PR, файлы, диапазоны добавленных строк,
+    коммиты, прогоны CI, горячие файлы и находки линтеров. Индексы по номеру PR, пути и sha
+    позволяют обновлять и читать по одному PR, не перечитывая всю историю.
+    Записи PR на выходе имеют ту же форму, что и элементы pr_enriched.json.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg, root=None):
+        # "raw_store": путь к файлу БД относительно каталога проекта root; не задан — данные остаются в data/raw/*.json
+        path = cfg.get("raw_store")
+        if not path:
+            return None
+        path = os.path.join(root or "", path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return cls(path)
+
+    def close(self):
+        self.db.close()
+
+    def reset(self):
+        """Полная перезагрузка (не инкрементальный режим): прежние PR и прогоны CI больше не актуальны."""
+        with self._lock, self.db:
+            for table in ("prs", "files", "added_ranges", "commits", "ci_runs", "ci_run_prs", "hot_files"):
+                self.db.execute(f"DELETE FROM {table}")
+
+    def upsert_prs(self, records):
+        records = list(records)
+        with self._lock, self.db:
+            # порядок как у merge_by_number в JSON-режиме: новая партия встаёт перед прежними PR
+            (first,) = self.db.execute("SELECT COALESCE(MIN(seq), 0) FROM prs").fetchone()
+            for i, r in enumerate(records):
+                n = r["number"]
+                ci = r.get("ci") or {}
+                self.db.execute(
+                    "INSERT OR REPLACE INTO prs VALUES (?,?,?,?,?,?,?,?)",
+                    (n, first - len(records) + i, r["title"], r.get("merged_at"), r["created_at"],
+                     ci.get("success", 0), ci.get("failure", 0), ci.get("duration_avg_sec", 0)),
+                )
+                for table in ("files", "added_ranges", "commits"):
+                    self.db.execute(f"DELETE FROM {table} WHERE pr_number=?", (n,))
+                for i, f in enumerate(r["files"]):
+                    self.db.execute("INSERT INTO files VALUES (?,?,?,?,?)", (n, i, f["path"], f["add"], f["del"]))
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO added_ranges VALUES (?,?,?,?)",
+                        ((n, f["path"], start, length) for start, length in added_ranges(f).pairs()),
+                    )
+                self.db.executemany(
+                    "INSERT INTO commits VALUES (?,?,?,?,?)",
+                    ((n, i, c["sha"], c["date"], c["message"]) for i, c in enumerate(r["commits"])),
+                )
+
+    def get_prs(self, numbers):
+        return [r for r in (self._load_pr(n) for n in numbers) if r is not None]
+
+    def pr_numbers(self):
+        return [n for (n,) in self.db.execute("SELECT number FROM prs ORDER BY seq")]
+
+    def iter_prs(self):
+        """PR по одному, в формате pr_enriched.json — память не зависит от размера истории."""
+        for n in self.pr_numbers():
+            yield self._load_pr(n)
+
+    def _load_pr(self, n):
+        row = self.db.execute("SELECT * FROM prs WHERE number=?", (n,)).fetchone()
+        if row is None:
+            return None
+        _, _, title, merged_at, created_at, succ, fail, dur = row
+        files = []
+        for path, add, dele in self.db.execute(
+            "SELECT path, additions, deletions FROM files WHERE pr_number=? ORDER BY pos", (n,)
+        ):
+            ranges = [[start, length] for start, length in self.db.execute(
+                "SELECT start, length FROM added_ranges WHERE pr_number=? AND path=? ORDER BY start", (n, path)
+            )]
+            files.append({"path": path, "add": add, "del": dele, "added_ranges": ranges})
+        commits = [
+            {"sha": sha, "date": date, "message": msg}
+            for sha, date, msg in self.db.execute(
+                "SELECT sha, date, message FROM commits WHERE pr_number=? ORDER BY pos", (n,)
+            )
+        ]
+        return {"number": n, "title": title, "merged_at": merged_at, "created_at": created_at,
+                "files": files, "commits": commits,
+                "ci": {"success": succ, "failure": fail, "duration_avg_sec": dur}}
+
+    def tee_runs(self, runs, batch=500):
+        """Пишет прогоны CI по мере поступления и отдаёт их дальше (для aggregate_ci_stream)."""
+        buf = []
+        for r in runs:
+            buf.append(r)
+            if len(buf) >= batch:
+                self.upsert_runs(buf)
+                buf = []
+            yield r
+        self.upsert_runs(buf)
+
+    def upsert_runs(self, runs):
+        with self._lock, self.db:
+            for r in runs:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO ci_runs VALUES (?,?,?,?,?)",
+                    (r["id"], r["head_sha"], r["status"], r["conclusion"], r["duration_sec"]),
+                )
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO ci_run_prs VALUES (?,?)", ((r["id"], n) for n in r["pr_numbers"])
+                )
+
+    def set_hot(self, hot):
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM hot_files")
+            self.db.executemany("INSERT INTO hot_files VALUES (?,?)", hot.items())
+
+    def hot_map(self):
+        return dict(self.db.execute("SELECT path, count FROM hot_files"))
+
+    def replace_findings(self, findings, source=None):
+        """
+        source — отпечаток файлов-отчётов; если он не изменился, таблица не перезаписывается
+        (и файл БД остаётся тем же, что важно для отпечатков входов в pipeline).
+        """
+        if source is not None:
+            row = self.db.execute("SELECT value FROM meta WHERE key='findings_source'").fetchone()
+            if row is not None and row[0] == source:
+                return False
+        with self._lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('findings_source', ?)", (source,))
+            self.db.execute("DELETE FROM findings")
+            self.db.executemany(
+                "INSERT INTO findings (tool, rule, severity, file, line, rid, is_new) VALUES (?,?,?,?,?,?,?)",
+                ((it.get("tool"), it.get("rule"), it.get("severity"), it.get("file"), it.get("line", 0),
+                  it.get("rid"), it.get("is_new")) for it in findings),
+            )
+        return True
+
+    def findings_for_pr(self, n):
+        """
+        Находки на добавленных строках PR (или на файле целиком, line=0) — то же сопоставление,
+        что extract_features.findings_for_pr, в исходном порядке находок.
+        """
+        rows = self.db.execute(
+            """
+            SELECT f.tool, f.rule, f.severity, f.file, f.line, f.rid, f.is_new FROM findings f
+            WHERE f.file IN (SELECT path FROM files WHERE pr_number=?)
+              AND (f.line = 0 OR EXISTS (
+                  SELECT 1 FROM added_ranges a WHERE a.pr_number=? AND a.path=f.file
+                  AND a.start <= f.line AND f.line < a.start + a.length))
+            ORDER BY f.id
+            """,
+            (n, n),
+        )
+        out = []
+        for tool, rule, sev, path, line, rid, is_new in rows:
+            it = {"tool": tool, "rule": rule, "severity": sev, "file": path, "line": line, "rid": rid}
+            if is_new is not None:
+                it["is_new"] = bool(is_new)
+            out.append(it)
+        return out
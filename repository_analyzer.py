@@ -1,8 +1,18 @@
+import argparse
+import importlib
 import json
 import subprocess
 import sys
+import time
 from pathlib import Path
 
+import git_mining
+from dashboard_pages import pages_config
+from ingest_reports import findings_stems
+from metrics import METRICS
+from online_stats import online_config
+from pipeline import Stage, run_stages
+
 
 class RepositoryAnalyzer:
     def __init__(
@@ -12,21 +22,43 @@ class RepositoryAnalyzer:
         github_repo: str | None = None,
         ollama_url: str = "http://127.0.0.1:11434/api/generate",
         ollama_model: str = "llama3.1:8b-instruct-q4_K_M",
+        incremental: bool = False,
+        llm_workers: int = 4,
+        llm_budget_sec: float | None = None,
+        fetch_max_age_sec: float = 3600,
+        work_dir: str | None = None,
+        scoped_static: bool = False,
     ):
         self.repo_root = Path(repo_root or Path(__file__).parent).resolve()
+        # каталог с config.json, data/ и reports/; по умолчанию — сам проект (в пакетном режиме у каждого репозитория свой)
+        self.work_dir = Path(work_dir).resolve() if work_dir else self.repo_root
         self.kotlin_repo_path = Path(kotlin_repo_path).resolve() if kotlin_repo_path else None
         self.github_repo = github_repo
         self.ollama_url = ollama_url
         self.ollama_model = ollama_model
-        self.data_dir = self.repo_root / "data"
+        self.incremental = incremental
+        self.llm_workers = llm_workers
+        self.llm_budget_sec = llm_budget_sec
+        self.fetch_max_age_sec = fetch_max_age_sec
+        # линтеры только на файлах, изменённых в PR выборки, с кэшем находок по содержимому (scoped_lint)
+        self.scoped_static = scoped_static
+        self.data_dir = self.work_dir / "data"
         self.raw_dir = self.data_dir / "raw"
         self.derived_dir = self.data_dir / "derived"
-        self.reports_dir = self.repo_root / "reports"
+        self.reports_dir = self.work_dir / "reports"
         self.tools_dir = self.repo_root / "tools"
         self.dashboard_json = self.derived_dir / "dashboard.json"
+        self.pipeline_state = self.derived_dir / "pipeline_state.json"
+
+    def _module(self, name: str):
+        for p in (self.tools_dir, self.repo_root):
+            if str(p) not in sys.path:
+                sys.path.insert(0, str(p))
+        return importlib.import_module(name)
 
+    # шаги идут параллельно в потоках одного процесса: каталог проекта передаётся явно, без os.chdir
     def clone_repository(self):
-        subprocess.run([sys.executable, str(self.repo_root / "fetch_github.py")], check=True)
+        self._module("fetch_github").main(str(self.work_dir))
 
     def run_static_analysis(self):
         if self.kotlin_repo_path is None:
@@ -36,45 +68,64 @@ class RepositoryAnalyzer:
         subprocess.run(["bash", str(detekt_script)], cwd=self.kotlin_repo_path, check=True)
         subprocess.run(["bash", str(ktlint_script)], cwd=self.kotlin_repo_path, check=True)
 
+    def run_scoped_static_analysis(self):
+        if self.kotlin_repo_path is None:
+            raise RuntimeError("kotlin_repo_path is not set")
+        self._module("scoped_lint").main(
+            ["--clone", str(self.kotlin_repo_path), "--reports_dir", str(self.reports_dir), "--work_dir", str(self.work_dir)]
+        )
+
     def extract_features(self):
-        subprocess.run([sys.executable, str(self.repo_root / "extract_features.py")], check=True)
+        self._module("extract_features").main(str(self.work_dir))
 
     def fetch_pull_requests(self):
         if not self.github_repo:
             raise RuntimeError("github_repo is not set")
         self.raw_dir.mkdir(parents=True, exist_ok=True)
         out_json = self.raw_dir / "prs.json"
-        subprocess.run(
-            [
-                sys.executable,
-                str(self.tools_dir / "fetch_prs.py"),
-                "--repo",
-                self.github_repo,
-                "--out",
-                str(out_json),
-            ],
-            check=True,
-        )
+        with (self.work_dir / "config.json").open("r", encoding="utf-8") as f:
+            cache_dir = ((json.load(f).get("http_cache") or {}).get("dir", "data/cache/http"))
+        argv = [
+            "--repo",
+            self.github_repo,
+            "--out",
+            str(out_json),
+            "--cache_dir",
+            str(self.work_dir / cache_dir),
+            "--config",
+            str(self.work_dir / "config.json"),
+        ]
+        if self.incremental:
+            argv.append("--incremental")
+        self._module("fetch_prs").main(argv)
         return out_json
 
     def enrich_with_llm(self, input_json: Path):
         self.derived_dir.mkdir(parents=True, exist_ok=True)
         out_json = self.dashboard_json
-        subprocess.run(
-            [
-                sys.executable,
-                str(self.tools_dir / "enrich_semantics.py"),
-                "--in",
-                str(input_json),
-                "--out",
-                str(out_json),
-                "--ollama_url",
-                self.ollama_url,
-                "--model",
-                self.ollama_model,
-            ],
-            check=True,
-        )
+        argv = [
+            "--in",
+            str(input_json),
+            "--out",
+            str(out_json),
+            "--ollama_url",
+            self.ollama_url,
+            "--model",
+            self.ollama_model,
+            "--workers",
+            str(self.llm_workers),
+            "--cache",
+            str(self.data_dir / "cache" / "llm_cache.json"),
+        ]
+        if self.llm_budget_sec is not None:
+            argv += ["--budget_sec", str(self.llm_budget_sec)]
+        with (self.work_dir / "config.json").open("r", encoding="utf-8") as f:
+            pages = pages_config(json.load(f), str(self.work_dir))
+        if pages:
+            argv += ["--pages_dir", pages["out_dir"], "--page_size", str(pages["page_size"])]
+            if pages["max_pages"]:
+                argv += ["--max_pages", str(pages["max_pages"])]
+        self._module("enrich_semantics").main(argv)
         return out_json
 
     def compute_risk_index(self) -> dict:
@@ -83,21 +134,130 @@ class RepositoryAnalyzer:
         with self.dashboard_json.open("r", encoding="utf-8") as f:
             return json.load(f)
 
-    def run_full_analysis(self, with_static: bool = False, with_llm: bool = True) -> dict:
-        self.clone_repository()
-        if with_static:
-            self.run_static_analysis()
-        self.extract_features()
+    def _git_head(self) -> str | None:
+        r = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=self.kotlin_repo_path, capture_output=True, text=True
+        )
+        return r.stdout.strip() or None
+
+    def build_stages(self, with_static: bool = False, with_llm: bool = True) -> list[Stage]:
+        root = self.work_dir
+        raw = self.raw_dir
+        with (root / "config.json").open("r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        # с "raw_store" сырые данные fetch_github лежат в одной SQLite-базе вместо JSON-файлов
+        if cfg.get("raw_store"):
+            raw_files = [root / cfg["raw_store"]]
+        else:
+            raw_files = [raw / "pr_enriched.json", raw / "hot_files_90d.json", raw / "ci_runs.json"]
+        # с "local_clone" файлы PR и горячесть берутся из git: новый HEAD клона — повод перезапустить загрузку
+        clone_head = git_mining.head(str(root / cfg["local_clone"])) if cfg.get("local_clone") else None
+        stages = [
+            Stage(
+                "fetch_github",
+                self.clone_repository,
+                inputs=[root / "config.json"],
+                outputs=raw_files,
+                params={"local_clone_head": clone_head} if clone_head else None,
+                max_age=self.fetch_max_age_sec,
+            ),
+        ]
+        if with_static and self.scoped_static:
+            if self.kotlin_repo_path is None:
+                raise RuntimeError("kotlin_repo_path is not set")
+            # набор файлов зависит от загруженных PR; неизменившиеся файлы берутся из кэша находок
+            stages.append(
+                Stage(
+                    "run_static_analysis",
+                    self.run_scoped_static_analysis,
+                    deps=["fetch_github"],
+                    inputs=[root / "config.json", *raw_files],
+                    outputs=[self.reports_dir / "detekt_findings.ndjson", self.reports_dir / "ktlint_findings.json"],
+                    params={"head": self._git_head()},
+                )
+            )
+        elif with_static:
+            if self.kotlin_repo_path is None:
+                raise RuntimeError("kotlin_repo_path is not set")
+            stages.append(
+                Stage(
+                    "run_static_analysis",
+                    self.run_static_analysis,
+                    inputs=[self.repo_root / "run_detekt.sh", self.repo_root / "run_ktlint.sh"],
+                    outputs=[self.kotlin_repo_path / "reports" / "detekt_findings.ndjson"],
+                    params={"head": self._git_head()},
+                )
+            )
+        stages.append(
+            Stage(
+                "extract_features",
+                self.extract_features,
+                deps=["fetch_github", "run_static_analysis"],
+                inputs=[
+                    root / "config.json",
+                    *raw_files,
+                    raw / "issues.json",
+                    # файлы находок ("findings" в config.json) — .ndjson или .json
+                    *(root / f"{stem}{ext}" for stem in findings_stems(cfg) for ext in (".ndjson", ".json")),
+                ],
+                # база онлайн-оценки (online_score) обновляется вместе с дашбордом
+                outputs=[root / cfg["output_json"], root / online_config(cfg)["state"]],
+            )
+        )
         if with_llm and self.github_repo:
-            prs_file = self.fetch_pull_requests()
-            self.enrich_with_llm(prs_file)
+            prs_json = raw / "prs.json"
+            stages.append(
+                Stage(
+                    "fetch_pull_requests",
+                    self.fetch_pull_requests,
+                    outputs=[prs_json],
+                    params={"repo": self.github_repo, "incremental": self.incremental},
+                    max_age=self.fetch_max_age_sec,
+                )
+            )
+            # пишет тот же dashboard.json, что и extract_features, поэтому идёт после него
+            stages.append(
+                Stage(
+                    "enrich_with_llm",
+                    lambda: self.enrich_with_llm(prs_json),
+                    deps=["fetch_pull_requests", "extract_features"],
+                    inputs=[prs_json],
+                    outputs=[self.dashboard_json],
+                    params={"model": self.ollama_model, "url": self.ollama_url, "budget": self.llm_budget_sec},
+                )
+            )
+        return stages
+
+    def run_full_analysis(
+        self,
+        with_static: bool = False,
+        with_llm: bool = True,
+        force: tuple[str, ...] = (),
+        profile: bool = False,
+    ) -> dict:
+        stages = self.build_stages(with_static=with_static, with_llm=with_llm)
+        profile_dir = self.derived_dir / "profile" if profile else None
+        # реестр не сбрасывается: в RiskService те же METRICS копят счётчики запросов между обновлениями
+        t0 = time.time()
+        try:
+            run_stages(stages, self.pipeline_state, force=force, profile_dir=profile_dir)
+        finally:
+            # метрики пишем и при падении шага — по ним видно, где остановились
+            METRICS.set("analysis_duration_seconds", round(time.time() - t0, 3))
+            METRICS.write(str(self.derived_dir))
         return self.compute_risk_index()
 
 
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profile", action="store_true")  # cProfile по шагам в data/derived/profile/<шаг>.prof
+    ap.add_argument("--force", default="")  # шаги через запятую, которые выполнить без проверки отпечатков
+    args = ap.parse_args()
     analyzer = RepositoryAnalyzer(
         github_repo="square/kotlinpoet",
         kotlin_repo_path=None,
     )
-    result = analyzer.run_full_analysis(with_static=False, with_llm=True)
+    result = analyzer.run_full_analysis(
+        with_static=False, with_llm=True, force=tuple(filter(None, args.force.split(","))), profile=args.profile
+    )
     print(json.dumps(result, ensure_ascii=False, indent=2))
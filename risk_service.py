@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from dashboard_pages import HIGH_THRESHOLD, histogram, iter_by_score, kpis, score_stats
+from metrics import METRICS
+from online_score import PrContext, fetch_record, score_pr, setup_fetch
+from online_stats import OnlineScorer, online_config
+from repository_analyzer import RepositoryAnalyzer
+
+
+# метка route у метрик запросов — из фиксированного набора: произвольный путь не порождает новую серию
+ROUTES = ("/prs", "/top", "/summary", "/health", "/refresh")
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def check_record(record: dict):
+    """Запись pr_enriched из тела POST: ValueError, если поля не той формы, что ждёт pr_features."""
+    files = record.get("files")
+    if not isinstance(files, list):
+        raise ValueError("PR record: files must be a list")
+    for f in files:
+        if not isinstance(f, dict) or not isinstance(f.get("path"), str) or not _number(f.get("add")) or not _number(f.get("del")):
+            raise ValueError("PR record: each file must be an object with path, add and del")
+    if not isinstance(record.get("commits", []), list):
+        raise ValueError("PR record: commits must be a list")
+    ci = record.get("ci")
+    if not isinstance(ci, dict) or not all(_number(ci.get(k)) for k in ("success", "failure", "duration_avg_sec")):
+        raise ValueError("PR record: ci must be an object with success, failure and duration_avg_sec")
+
+
+class Snapshot:
+    """
+    Неизменяемый снимок дашборда в памяти: PR по убыванию score, индекс по номеру,
+    готовые JSON-ответы по каждому PR и сводка. Запросы читают текущий снимок без блокировок;
+    обновление собирает новый и подменяет ссылку целиком.
+    """
+
+    def __init__(self, prs: list[dict], source: str | None = None, thr: float = HIGH_THRESHOLD):
+        self.created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.source = source
+        self.mtime = os.path.getmtime(source) if source and os.path.exists(source) else None
+        self.thr = thr
+        self.n = len(prs)
+        self.ranked = [
+            dict(pr, rank=rank, percentile=round(1 - (rank - 1) / self.n, 4), zone="high" if (pr.get("score") or 0) >= thr else "mid")
+            for rank, pr in enumerate(iter_by_score(prs), 1)
+        ]
+        self.by_number = {pr["number"]: pr for pr in self.ranked}
+        self.body = {pr["number"]: _dumps(pr) for pr in self.ranked}
+        scores = [pr.get("score") or 0 for pr in self.ranked]
+        self.summary = {
+            "n": self.n,
+            "created": self.created,
+            "source_mtime": self.mtime,
+            "kpis": kpis(self.ranked, thr),
+            "histogram": histogram(scores),
+            "stats": score_stats(scores),
+        }
+        self.summary_body = _dumps(self.summary)
+
+    @classmethod
+    def load(cls, path, thr: float = HIGH_THRESHOLD) -> "Snapshot":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f).get("prs", []), source=str(path), thr=thr)
+
+    def page(self, offset: int = 0, limit: int = 50, zone: str | None = None) -> list[dict]:
+        items = self.ranked if zone is None else [pr for pr in self.ranked if pr["zone"] == zone]
+        return items[offset:offset + limit]
+
+
+class RiskService:
+    """
+    Долгоживущий процесс: держит снимок дашборда в памяти и по запросу обновляет его в фоне.
+    Обновление — инкрементальный прогон конвейера RepositoryAnalyzer в этом же процессе
+    (модули, HTTP-сессии с keep-alive и кэши остаются прогретыми); чтения всё это время
+    обслуживаются из предыдущего снимка.
+    Новые PR оцениваются онлайн (OnlineScorer) по базе последнего пакетного прогона;
+    после rebaseline_every таких оценок сервис сам запускает обновление.
+    """
+
+    def __init__(self, analyzer: RepositoryAnalyzer, with_llm: bool = False):
+        self.analyzer = analyzer
+        self.with_llm = with_llm
+        self.snapshot = Snapshot([])
+        self._refresh_lock = threading.Lock()
+        self.refreshing = False
+        self.last_refresh = None
+        self.scorer = None
+        self.scorer_mtime = None
+        self.ctx = None
+        self._score_lock = threading.Lock()
+        self._fetch_ready = False
+
+    def reload(self) -> Snapshot:
+        """Перечитать dashboard.json, если он изменился (например, после прогона из cron)."""
+        path = self.analyzer.dashboard_json
+        if path.exists() and os.path.getmtime(path) != self.snapshot.mtime:
+            self.snapshot = Snapshot.load(path)
+            METRICS.set("service_snapshot_prs", self.snapshot.n)
+        self._reload_scorer()
+        return self.snapshot
+
+    def _config(self) -> dict:
+        with (self.analyzer.work_dir / "config.json").open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _reload_scorer(self):
+        # новая база онлайн-оценки появляется после каждого extract_features
+        state = self.analyzer.work_dir / online_config(self._config())["state"]
+        mtime = os.path.getmtime(state) if state.exists() else None
+        if mtime is None or mtime == self.scorer_mtime:
+            return
+        with self._score_lock:
+            self.scorer = OnlineScorer.load(str(state))
+            self.scorer_mtime = mtime
+            self.ctx = PrContext(self._config(), str(self.analyzer.work_dir))
+
+    def score(self, number: int, record: dict | None = None, update: bool = True) -> dict:
+        """
+        Онлайн-оценка одного PR: запись в формате pr_enriched из тела запроса
+        или загруженная с GitHub. С update PR входит в статистику и состояние сохраняется.
+        """
+        if self.scorer is None:
+            raise RuntimeError("online state not found: run extract_features first")
+        cfg = self._config()
+        if record is None:
+            if not self._fetch_ready:
+                if not setup_fetch(cfg, "risk_service"):
+                    raise RuntimeError("GITHUB_TOKEN not set")
+                self._fetch_ready = True
+            owner, repo = cfg["repo"].split("/")
+            record = fetch_record(owner, repo, number, os.getenv("GITHUB_TOKEN", "").strip())
+        record = dict(record, number=number)
+        with self._score_lock:
+            res = score_pr(record, self.scorer, self.ctx, update=update)
+            # во время обновления extract_features пишет новую базу: сохранение старой затёрло бы её,
+            # а обновлённый scorer_mtime не дал бы _reload_scorer её подхватить
+            if update and not self.refreshing:
+                state = online_config(cfg, str(self.analyzer.work_dir))["state"]
+                self.scorer.save(state)
+                self.scorer_mtime = os.path.getmtime(state)
+            rebaseline = self.scorer.needs_rebaseline
+        METRICS.inc("service_online_scored_total")
+        if rebaseline:
+            self.refresh(rebaseline=True)
+        return res
+
+    def _refresh(self, run_pipeline: bool, rebaseline: bool = False):
+        t0 = time.time()
+        status = {"started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t0)), "rebaseline": rebaseline}
+        try:
+            if run_pipeline:
+                # база онлайн-оценки — выход extract_features, не вход: без force шаг пропустился бы
+                # при неизменившихся данных, и needs_rebaseline остался бы взведённым
+                force = ("extract_features",) if rebaseline else ()
+                self.analyzer.run_full_analysis(with_llm=self.with_llm, force=force)
+            self.reload()
+            status["ok"] = True
+        except (Exception, SystemExit) as e:
+            # прежний снимок остаётся в работе; скрипты конвейера сообщают о фатальном через sys.exit
+            status["ok"] = False
+            status["error"] = f"{type(e).__name__}: {e}"
+            METRICS.inc("service_refresh_errors_total")
+        finally:
+            status["seconds"] = round(time.time() - t0, 3)
+            self.last_refresh = status
+            self.refreshing = False
+            self._refresh_lock.release()
+
+    def refresh(self, run_pipeline: bool = True, rebaseline: bool = False) -> bool:
+        """
+        Запустить обновление в фоне; False — обновление уже идёт.
+        rebaseline — пересчитать базу онлайн-оценки, даже если данные не изменились.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        self.refreshing = True
+        threading.Thread(target=self._refresh, args=(run_pipeline, rebaseline), name="risk-refresh", daemon=True).start()
+        return True
+
+    def status(self) -> dict:
+        online = None
+        if self.scorer is not None:
+            online = {"baseline_at": self.scorer.baseline_at, "updates": self.scorer.updates, "threshold": self.scorer.threshold}
+        return {"prs": self.snapshot.n, "snapshot": self.snapshot.created, "refreshing": self.refreshing, "last_refresh": self.last_refresh, "online": online}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    GET /prs?offset=&limit=&zone=   PR по убыванию score
+    GET /prs/{n}                    один PR с rank и percentile
+    GET /top?k=10                   top-K
+    GET /summary                    KPI, гистограмма и статистика score
+    GET /health                     состояние снимка и последнего обновления
+    POST /prs/{n}/score[?dry_run=1] онлайн-оценка PR; тело — запись pr_enriched или пусто (загрузить с GitHub)
+    POST /refresh[?reload_only=1]   фоновое обновление (202) или 409, если уже идёт
+    """
+
+    service: RiskService = None
+    protocol_version = "HTTP/1.1"  # keep-alive: боты CI задают вопросы по одному соединению
+    # заголовки и тело уходят разными write: без TCP_NODELAY Nagle + delayed ACK дают ~40 мс на ответ
+    disable_nagle_algorithm = True
+
+    def _send(self, code: int, body: bytes):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method: str):
+        t0 = time.perf_counter()
+        url = urlparse(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        route = "/" + "/".join(parts[:1])
+        if route not in ROUTES:
+            route = "other"
+        try:
+            code, body = self._dispatch(method, parts, q)
+        except ValueError as e:
+            code, body = 400, _dumps({"error": str(e)})
+        except Exception as e:
+            # ответ клиенту нужен всегда: иначе keep-alive соединение просто обрывается
+            code, body = 500, _dumps({"error": f"{type(e).__name__}: {e}"})
+        self._send(code, body)
+        METRICS.inc("service_requests_total", route=route, status=code)
+        METRICS.observe("service_request_seconds", time.perf_counter() - t0, buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1), route=route)
+
+    def _dispatch(self, method: str, parts: list[str], q: dict):
+        snap = self.service.snapshot
+        if method == "POST" and parts == ["refresh"]:
+            started = self.service.refresh(run_pipeline=q.get("reload_only") not in ("1", "true"))
+            return (202 if started else 409), _dumps(self.service.status())
+        if method == "POST" and len(parts) == 3 and parts[0] == "prs" and parts[2] == "score":
+            length = int(self.headers.get("Content-Length") or 0)
+            record = json.loads(self.rfile.read(length)) if length else None
+            if record is not None:
+                if not isinstance(record, dict):
+                    raise ValueError("PR record must be a JSON object")
+                check_record(record)
+            try:
+                res = self.service.score(int(parts[1]), record, update=q.get("dry_run") not in ("1", "true"))
+            except RuntimeError as e:
+                return 503, _dumps({"error": str(e)})
+            except KeyError as e:
+                return 400, _dumps({"error": f"PR record without {e}"})
+            except OSError as e:
+                return 502, _dumps({"error": f"GitHub: {e}"})
+            return 200, _dumps(res)
+        if method != "GET":
+            return 405, _dumps({"error": "method not allowed"})
+        if parts == ["prs"]:
+            offset = int(q.get("offset", 0))
+            limit = min(int(q.get("limit", 50)), 1000)
+            if offset < 0 or limit < 0:
+                raise ValueError("offset and limit must be non-negative")
+            return 200, _dumps({"n": snap.n, "offset": offset, "prs": snap.page(offset, limit, q.get("zone"))})
+        if len(parts) == 2 and parts[0] == "prs":
+            body = snap.body.get(int(parts[1]))
+            return (200, body) if body is not None else (404, _dumps({"error": f"PR {parts[1]} not found"}))
+        if parts == ["top"]:
+            k = min(int(q.get("k", 10)), 1000)
+            if k < 0:
+                raise ValueError("k must be non-negative")
+            return 200, _dumps({"n": snap.n, "prs": snap.page(0, k)})
+        if parts == ["summary"]:
+            return 200, snap.summary_body
+        if parts == ["health"]:
+            return 200, _dumps(self.service.status())
+        return 404, _dumps({"error": "not found"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(service: RiskService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    handler = type("RiskHandler", (Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    root = Path(__file__).parent.resolve()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--work_dir", default=None)  # каталог с config.json/data, как у RepositoryAnalyzer
+    ap.add_argument("--repo", default=None)
+    ap.add_argument("--with_llm", action="store_true")
+    ap.add_argument("--refresh_on_start", action="store_true")
+    args = ap.parse_args(argv)
+    work = Path(args.work_dir).resolve() if args.work_dir else root
+    with (work / "config.json").open("r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    analyzer = RepositoryAnalyzer(repo_root=str(root), work_dir=str(work), github_repo=args.repo or cfg.get("repo"), incremental=True)
+    service = RiskService(analyzer, with_llm=args.with_llm)
+    service.reload()
+    if args.refresh_on_start:
+        service.refresh()
+    server = serve(service, args.host, args.port)
+    print(f"risk service on http://{args.host}:{args.port} ({service.snapshot.n} PRs)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,4 +14,4 @@ else
   curl -L -o ktlint.jar https://github.com/pinterest/ktlint/releases/download/${KVER}/ktlint-${KVER}-all.jar
   java -jar ktlint.jar --reporter=json > reports/ktlint.json || true
 fi
-python3 parse_ktlint.py reports/ktlint.json reports/ktlint_findings.json
+python3 parse_ktlint.py reports/ktlint.json reports/ktlint_findings.json "$PWD"
@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+import parse_detekt
+from git_mining import local_clone
+from ingest_reports import repo_path
+from metrics import METRICS
+from raw_store import RawStore
+
+# Запуск линтера на явном списке файлов. {report} — путь отчёта checkstyle XML, его же разбирает parse_detekt.
+TOOLS = {
+    "detekt": {
+        "cmd": ["detekt-cli"],
+        "args": lambda files, report: ["--input", ",".join(files), "--report", f"xml:{report}"],
+        # конфигурация правил входит в ключ кэша: поменялись правила — находки пересчитываются
+        "configs": ["config/detekt/detekt.yml", "detekt.yml", "detekt-config.yml"],
+    },
+    "ktlint": {
+        "cmd": ["ktlint"],
+        "args": lambda files, report: [f"--reporter=checkstyle,output={report}", *files],
+        "configs": [".editorconfig"],
+    },
+}
+
+
+def lint_config(cfg, root=None):
+    """
+    Секция "scoped_lint" config.json: команды линтеров ({"detekt_cmd": ["java", "-jar", "detekt-cli.jar"], ...}),
+    каталог кэша (относительно каталога проекта root), число файлов на один запуск и расширения файлов.
+    """
+    c = cfg.get("scoped_lint") or {}
+    return {
+        "cmds": {name: c.get(f"{name}_cmd") or t["cmd"] for name, t in TOOLS.items()},
+        "cache_dir": os.path.join(root or "", c.get("cache_dir", "data/cache/lint")),
+        "batch": int(c.get("batch", 200)),
+        "extensions": tuple(c.get("extensions", (".kt", ".kts"))),
+    }
+
+
+def pr_paths(cfg, extensions=(".kt", ".kts"), root=None):
+    """Пути файлов с добавленными строками во всех PR выборки — только на них находки идут в признаки."""
+    store = RawStore.from_config(cfg, root)
+    if store is not None:
+        prs = store.iter_prs()
+    else:
+        with open(os.path.join(root or "", "data/raw/pr_enriched.json"), "r", encoding="utf-8") as f:
+            prs = json.load(f)
+    paths = {f["path"] for pr in prs for f in pr["files"] if f.get("add") and f["path"].endswith(extensions)}
+    if store is not None:
+        store.close()
+    return sorted(paths)
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def tool_fingerprint(clone, name, cmd):
+    h = hashlib.sha256(json.dumps([name, cmd]).encode("utf-8"))
+    for rel in TOOLS[name]["configs"]:
+        p = os.path.join(clone, rel)
+        if os.path.exists(p):
+            h.update(rel.encode("utf-8"))
+            h.update(file_hash(p).encode("utf-8"))
+    return h.hexdigest()
+
+
+class FindingsCache:
+    """
+    Находки линтера по содержимому файла: ключ — sha256 версии линтера/правил и содержимого,
+    значение — [{"rule", "severity", "line"}] без пути (одинаковый файл под другим путём — то же попадание).
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, tool_fp, content):
+        key = hashlib.sha256((tool_fp + content).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def get(self, tool_fp, content):
+        p = self._path(tool_fp, content)
+        if not os.path.exists(p):
+            return None
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, tool_fp, content, entries):
+        p = self._path(tool_fp, content)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        with open(p + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(p + ".tmp", p)
+
+
+def iter_checkstyle(path, clone):
+    """(путь относительно клона, {"rule", "severity", "line"}) по отчёту checkstyle XML."""
+    for _, el in ET.iterparse(path):
+        if el.tag == "file":
+            # линтеры пишут абсолютные пути — приводим к путям репозитория, как у GitHub
+            name = repo_path(el.get("name"), clone)
+            for err in el.findall("error"):
+                it = parse_detekt.finding(name, err)
+                yield name, {"rule": it["rule"], "severity": it["severity"], "line": it["line"]}
+            el.clear()
+
+
+def run_tool(clone, name, cmd, files, batch=200):
+    """
+    Линтер на списке files (пути относительно клона) пачками. Возвращает (путь -> находки, число файлов
+    в упавших пачках): у чистых файлов — [], файлов из упавших пачек в словаре нет — они попадут
+    в следующий запуск, а успешные пачки не пропадают. Линтер не найден (OSError) — остальные пачки не запускаются.
+    """
+    out = {}
+    failed = 0
+    for i in range(0, len(files), batch):
+        chunk = files[i:i + batch]
+        fd, report = tempfile.mkstemp(prefix=f"{name}-", suffix=".xml")
+        os.close(fd)
+        try:
+            # код возврата не смотрим: detekt и ktlint завершаются ненулевым, когда нашли нарушения
+            with METRICS.timer("lint_run_seconds", tool=name):
+                r = subprocess.run([*cmd, *TOOLS[name]["args"](chunk, report)], cwd=clone, capture_output=True, text=True)
+            if os.path.getsize(report) == 0:
+                raise RuntimeError(f"{name} wrote no report (exit {r.returncode}): {r.stderr.strip()[-500:]}")
+            res = {p: [] for p in chunk}
+            for p, entry in iter_checkstyle(report, clone):
+                if p in res:
+                    res[p].append(entry)
+        except (OSError, RuntimeError, ET.ParseError) as e:
+            print(f"{name}: files {i + 1}-{i + len(chunk)} of {len(files)} skipped: {e}", file=sys.stderr)
+            METRICS.inc("lint_errors_total", tool=name)
+            if isinstance(e, OSError):
+                failed += len(files) - i
+                break
+            failed += len(chunk)
+            continue
+        finally:
+            os.remove(report)
+        out.update(res)
+        METRICS.inc("lint_files_analyzed_total", len(chunk), tool=name)
+    return out, failed
+
+
+def analyze(clone, paths, cfg, root=None):
+    """
+    Находки по каждому файлу из paths для всех линтеров: из кэша по хэшу содержимого,
+    промахи — одним запуском линтера на все изменившиеся файлы. Возвращает ({tool: {path: entries}},
+    число пропусков: файл, не проанализированный одним из линтеров, считается за каждый такой линтер).
+    """
+    lc = lint_config(cfg, root)
+    cache = FindingsCache(lc["cache_dir"])
+    present = [p for p in paths if os.path.isfile(os.path.join(clone, p))]
+    hashes = {p: file_hash(os.path.join(clone, p)) for p in present}
+    res = {}
+    failed_total = 0
+    for name in TOOLS:
+        cmd = lc["cmds"][name]
+        fp = tool_fingerprint(clone, name, cmd)
+        found = {}
+        miss = []
+        for p in present:
+            entries = cache.get(fp, hashes[p])
+            if entries is None:
+                miss.append(p)
+            else:
+                found[p] = entries
+        METRICS.inc("lint_cache_total", len(found), tool=name, result="hit")
+        METRICS.inc("lint_cache_total", len(miss), tool=name, result="miss")
+        print(f"{name}: {len(present)} files, {len(found)} cached, {len(miss)} to analyze")
+        if miss:
+            # линтер не установлен или упал на части пачек: кэшируются успешные пачки, остальное — в следующий запуск
+            fresh, failed = run_tool(clone, name, cmd, miss, lc["batch"])
+            if failed:
+                print(f"{name}: {failed} files not analyzed", file=sys.stderr)
+                failed_total += failed
+            for p, entries in fresh.items():
+                cache.put(fp, hashes[p], entries)
+                found[p] = entries
+        res[name] = found
+    return res, failed_total
+
+
+def write_outputs(res, reports_dir, baseline_path=None):
+    """Те же файлы, что пишут run_detekt.sh/run_ktlint.sh: detekt_findings.ndjson и ktlint_findings.json."""
+    os.makedirs(reports_dir, exist_ok=True)
+    bl = parse_detekt.load_baseline(baseline_path) if baseline_path else set()
+
+    def detekt():
+        for p in sorted(res.get("detekt", {})):
+            for e in res["detekt"][p]:
+                rid = f"{p}:{e['rule']}:{e['line']}"
+                yield {"tool": "detekt", "rule": e["rule"], "severity": e["severity"], "file": p, "line": e["line"], "rid": rid, "is_new": rid not in bl}
+
+    def ktlint():
+        for p in sorted(res.get("ktlint", {})):
+            for e in res["ktlint"][p]:
+                yield {"tool": "ktlint", "rule": e["rule"], "severity": e["severity"], "file": p, "line": e["line"],
+                       "rid": f"{p}:{e['rule']}:{e['line']}", "is_new": True}
+
+    parse_detekt.write_findings(detekt(), os.path.join(reports_dir, "detekt_findings.ndjson"))
+    parse_detekt.write_findings(ktlint(), os.path.join(reports_dir, "ktlint_findings.json"))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clone", default=None)  # по умолчанию "local_clone" из config.json
+    ap.add_argument("--reports_dir", default="reports")
+    ap.add_argument("--work_dir", default=None)  # каталог с config.json и data/, по умолчанию текущий
+    args = ap.parse_args(argv)
+    root = args.work_dir
+    with open(os.path.join(root or "", "config.json"), "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    clone = os.path.abspath(args.clone) if args.clone else local_clone(cfg, root)
+    if not clone:
+        sys.exit("no clone: pass --clone or set local_clone in config.json")
+    lc = lint_config(cfg, root)
+    paths = pr_paths(cfg, lc["extensions"], root)
+    res, failed = analyze(clone, paths, cfg, root)
+    baseline = next((os.path.join(clone, p) for p in ("config/detekt/baseline.xml", "detekt-baseline.xml")
+                     if os.path.exists(os.path.join(clone, p))), None)
+    write_outputs(res, args.reports_dir, baseline)
+    if failed:
+        # находки успешных пачек записаны, но шаг — неуспешный: run_stages не сохранит отпечаток и повторит его
+        sys.exit(f"{failed} file(s) not analyzed by some linter, rerun to pick them up")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        # и при неполном анализе: lint_errors_total показывает, какой линтер упал
+        METRICS.write()
@@ -0,0 +1,69 @@
+import os, sys, argparse, json, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from line_ranges import added_ranges
+
+
+def to_ranges(prs):
+    """pr_enriched в новом формате: added_lines -> added_ranges."""
+    return [dict(p, files=[{k: v for k, v in f.items() if k != "added_lines"} | {"added_ranges": added_ranges(f).to_json()}
+                           for f in p["files"]]) for p in prs]
+
+
+def migration_pr(n_files, lines_per_file):
+    """Массовая миграция: каждый файл переписан целиком, все строки — добавленные."""
+    files = [{"path": f"module{i % 40}/src/main/kotlin/File{i}.kt", "add": lines_per_file, "del": lines_per_file,
+              "added_lines": list(range(1, lines_per_file + 1))} for i in range(n_files)]
+    return {"number": 1, "title": "migration", "files": files, "commits": [], "ci": {}}
+
+
+def held_bytes(build):
+    """Сколько памяти занимает результат build() (tracemalloc, без учёта временных объектов)."""
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def measure(name, prs):
+    new = to_ranges(prs)
+    files = [f for p in prs for f in p["files"]]
+    lines = sum(len(f.get("added_lines", [])) for f in files)
+    res = {
+        "dataset": name,
+        "files": len(files),
+        "added_lines": lines,
+        "ranges": sum(len(f["added_ranges"]) for p in new for f in p["files"]),
+        # как пишет fetch_github (indent=2)
+        "json_old_kb": round(len(json.dumps(prs, ensure_ascii=False, indent=2).encode("utf-8")) / 1024, 1),
+        "json_new_kb": round(len(json.dumps(new, ensure_ascii=False, indent=2).encode("utf-8")) / 1024, 1),
+        # списки строк заново читаются из JSON, чтобы учесть и сами int-объекты, как при загрузке pr_enriched;
+        # прежний findings_for_pr строил из них set на каждый файл, новый держит LineRanges
+        "mem_list_kb": round(held_bytes(lambda: [json.loads(json.dumps(f.get("added_lines", []))) for f in files]) / 1024, 1),
+        "mem_set_kb": round(held_bytes(lambda: [set(json.loads(json.dumps(f.get("added_lines", [])))) for f in files]) / 1024, 1),
+        "mem_ranges_kb": round(held_bytes(lambda: [added_ranges(f) for f in files]) / 1024, 1),
+    }
+    print(json.dumps(res, ensure_ascii=False))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", default="data/raw/pr_enriched.json")
+    ap.add_argument("--migration_files", type=int, default=500)
+    ap.add_argument("--migration_lines", type=int, default=400)
+    args = ap.parse_args()
+
+    if os.path.exists(args.inp):
+        with open(args.inp, "r", encoding="utf-8") as f:
+            prs = json.load(f)
+        if any("added_lines" in f for p in prs for f in p["files"]):
+            measure(args.inp, prs)
+        else:
+            print(f"{args.inp} is already in added_ranges format, skipped")
+    measure("synthetic migration PR", [migration_pr(args.migration_files, args.migration_lines)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os, sys, argparse, json, time, random, resource, subprocess, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import parse_detekt
+
+RULES = ["detekt.Indentation", "detekt.MaxLineLength", "detekt.CyclomaticComplexMethod",
+         "detekt.MagicNumber", "detekt.LongMethod", "detekt.Filename"]
+
+
+def generate(path, size_mb, seed=1):
+    """
+    Синтетический detekt-отчёт (checkstyle XML) размером ~size_mb.
+    Структура как у reports/detekt.xml: файлы по 20–200 ошибок с длинным message.
+    """
+    rnd = random.Random(seed)
+    limit = size_mb * 1024 * 1024
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<checkstyle version="4.3">\n')
+        n = 0
+        while f.tell() < limit:
+            f.write(f'<file name="module{n % 50}/src/main/kotlin/pkg{n % 300}/File{n}.kt">\n')
+            for _ in range(rnd.randint(20, 200)):
+                line = rnd.randint(1, 3000)
+                f.write(f'\t<error line="{line}" column="{rnd.randint(1, 120)}" severity="warning" '
+                        f'message="Unexpected indentation ({rnd.randint(0, 8)}) (should be {rnd.randint(0, 8)})" '
+                        f'source="{rnd.choice(RULES)}" />\n')
+            f.write("</file>\n")
+            n += 1
+        f.write("</checkstyle>\n")
+
+
+def child(mode, path):
+    """Замер в отдельном процессе: ru_maxrss не смешивается между парсерами."""
+    t0 = time.perf_counter()
+    if mode == "tree":
+        count = len(parse_detekt.parse_detekt_xml(path))
+    else:
+        count = sum(1 for _ in parse_detekt.iter_detekt_xml(path))
+    dt = time.perf_counter() - t0
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"mode": mode, "findings": count, "seconds": round(dt, 2), "peak_rss_mb": round(rss_kb / 1024, 1)}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size_mb", type=int, default=500)
+    ap.add_argument("--report", default=None)  # готовый отчёт вместо синтетического
+    ap.add_argument("--child", choices=("tree", "stream"), default=None)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.child, args.report)
+        return
+
+    path = args.report
+    tmp = None
+    if path is None:
+        tmp = tempfile.NamedTemporaryFile(suffix=".xml", delete=False)
+        tmp.close()
+        path = tmp.name
+        generate(path, args.size_mb)
+    try:
+        print(f"report: {path} ({os.path.getsize(path) / 1024 / 1024:.0f} MB)")
+        for mode in ("stream", "tree"):
+            r = subprocess.run([sys.executable, __file__, "--child", mode, "--report", path],
+                               capture_output=True, text=True, check=True)
+            print(r.stdout.strip())
+    finally:
+        if tmp is not None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
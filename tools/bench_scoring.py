@@ -0,0 +1,82 @@
+import os, sys, argparse, json, time, random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extract_features as ef
+
+
+def legacy_score(cols):
+    """
+    Прежний построчный расчёт из extract_features.main (до колоночного движка), эталон для сверки:
+    max() по всей выборке внутри цикла по PR и полный sort для q70.
+    """
+    ci_fail_n = ef.norm_minmax(cols["ci_fail"]); ci_dur_n = ef.norm_minmax(cols["ci_dur"])
+    size_n = ef.norm_minmax(cols["size"]); spread_n = ef.norm_minmax(cols["spread"])
+    sa_n = ef.norm_minmax(cols["sa"]); hot_n = ef.norm_minmax(cols["hot"])
+    sa_raw = cols["sa"]; spreads = cols["spread"]; w = ef.weights
+    enriched = []
+    for i in range(len(sa_raw)):
+        ci_n = (ci_fail_n[i] + ci_dur_n[i]) / 2
+        sem_score = 0.0
+        sem_cat = "Общее"
+        if sa_raw[i] > 0.9 * max(sa_raw): sem_cat, sem_score = "Безопасность", 0.8
+        elif spreads[i] > 0.9 * max(spreads): sem_cat, sem_score = "API", 0.6
+        score = w["ci"] * ci_n + w["sa"] * sa_n[i] + w["size"] * size_n[i] + w["spread"] * spread_n[i] + w["hot"] * hot_n[i] + w["sem"] * sem_score
+        enriched.append({"ciN": ci_n, "saN": sa_n[i], "sizeN": size_n[i], "spreadN": spread_n[i], "hotN": hot_n[i], "semN": sem_score, "score": score, "semCat": sem_cat})
+    scores_sorted = sorted(e["score"] for e in enriched)
+    q70 = scores_sorted[int(len(enriched) * 0.7)] if enriched else 0
+    for e in enriched:
+        e["zone"] = "high" if e["score"] >= q70 else "mid"
+    return enriched
+
+
+def synthetic_columns(n, seed=7):
+    """Признаки с распределениями, похожими на реальные: тяжёлый хвост у размера и находок, много нулей."""
+    rnd = random.Random(seed)
+    cols = {"ci_fail": [], "ci_dur": [], "sa": [], "size": [], "spread": [], "hot": []}
+    for _ in range(n):
+        runs = rnd.randint(0, 20)
+        cols["ci_fail"].append(rnd.randint(0, runs) / max(1, runs))
+        cols["ci_dur"].append(rnd.randint(0, 3600))
+        cols["sa"].append(0 if rnd.random() < 0.6 else sum(rnd.choice((1.0, 0.7, 0.4, 0.2)) for _ in range(int(rnd.paretovariate(1.5)))))
+        cols["size"].append(int(rnd.paretovariate(1.2) * 20))
+        cols["spread"].append(rnd.randint(1, 12))
+        cols["hot"].append(rnd.randint(0, 400))
+    return cols
+
+
+def as_rows(res):
+    return [{k: res[k][i] for k in ("ciN", "saN", "sizeN", "spreadN", "hotN", "semN", "score", "semCat", "zone")} for i in range(len(res["score"]))]
+
+
+def timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    r = fn(*a, **kw)
+    return r, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=100000)        # размер выборки для замера движка
+    ap.add_argument("--parity_n", type=int, default=3000)   # прежний цикл O(n²), сверяем на меньшей выборке
+    args = ap.parse_args()
+
+    # сверка: обе реализации движка должны давать ровно тот же результат, что прежний цикл
+    cols = synthetic_columns(args.parity_n)
+    ref, t_ref = timed(legacy_score, cols)
+    modes = [False] + ([True] if ef.np is not None else [])
+    for use_numpy in modes:
+        got = as_rows(ef.score_columns(cols, use_numpy=use_numpy))
+        if json.dumps(got) != json.dumps(ref):
+            sys.exit(f"parity FAILED (numpy={use_numpy})")
+    print(f"parity ok on {args.parity_n} PRs (legacy {t_ref:.2f}s)")
+
+    cols = synthetic_columns(args.n)
+    res = {"n": args.n}
+    for use_numpy in modes:
+        _, dt = timed(ef.score_columns, cols, use_numpy=use_numpy)
+        res["numpy_s" if use_numpy else "python_s"] = round(dt, 3)
+    print(json.dumps(res))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import os, sys, argparse, json, time, tempfile, shutil, platform, datetime, tracemalloc, gc, random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fetch_github as fg
+import extract_features as ef
+import parse_detekt
+import parse_ktlint
+from synth_data import Dataset
+
+# baseline — локальный файл машины, где гоняют бенчмарки: абсолютные секунды с другой машины несравнимы
+BASELINE = "data/derived/bench_baseline.json"
+
+
+def stage_list_files(ds, work):
+    # разбор patch в диапазоны добавленных строк; HTTP подменён готовыми ответами /pulls/N/files
+    def setup():
+        fg.get_paged = lambda url, token, params: ds.files_payload[int(url.rstrip("/").split("/")[-2])]
+        return [pr["number"] for pr in ds.prs]
+
+    def run(nums):
+        return [fg.list_files("gradle", "gradle", n, "-") for n in nums]
+    return setup, run
+
+
+def stage_compute_hot(ds, work):
+    return (lambda: fg.files_history(ds.records)), (lambda hist: fg.compute_hot(hist, 90))
+
+
+def stage_aggregate_ci(ds, work):
+    # поток прогонов Actions -> run_record -> счётчики по PR, как в fetch_github.main
+    def setup():
+        return {r["number"]: r["commits"] for r in ds.records}
+    return setup, lambda commits_by_pr: fg.aggregate_ci_stream(map(fg.run_record, ds.runs_payload), commits_by_pr)
+
+
+def stage_aggregate_ci_for_pr(ds, work):
+    def setup():
+        return fg.index_runs([fg.run_record(r) for r in ds.runs_payload])
+
+    def run(idx):
+        return [fg.aggregate_ci_for_pr(idx, r["commits"], r["number"]) for r in ds.records]
+    return setup, run
+
+
+def stage_parse_detekt(ds, work):
+    # потоковый разбор + baseline + NDJSON — то, что делает run_detekt.sh; результат нужен extract_features
+    def run(_):
+        out = os.path.join(work, "reports", "detekt_findings.ndjson")
+        bl = parse_detekt.load_baseline(os.path.join(work, "reports", "detekt-baseline.xml"))
+        def marked():
+            for it in parse_detekt.iter_detekt_xml(os.path.join(work, "reports", "detekt.xml")):
+                it["is_new"] = it["rid"] not in bl
+                yield it
+        parse_detekt.write_findings(marked(), out)
+    return (lambda: None), run
+
+
+def stage_parse_detekt_xml(ds, work):
+    return (lambda: os.path.join(work, "reports", "detekt.xml")), parse_detekt.parse_detekt_xml
+
+
+def stage_parse_ktlint(ds, work):
+    def run(_):
+        argv = sys.argv
+        sys.argv = ["parse_ktlint.py", os.path.join(work, "reports", "ktlint.json"), os.path.join(work, "reports", "ktlint_findings.json")]
+        try:
+            parse_ktlint.main()
+        finally:
+            sys.argv = argv
+    return (lambda: None), run
+
+
+def ensure_findings(ds, work):
+    # при выборочном --stages файлы находок могли ещё не появиться
+    for make, path in ((stage_parse_detekt, "detekt_findings.ndjson"), (stage_parse_ktlint, "ktlint_findings.json")):
+        if not os.path.exists(os.path.join(work, "reports", path)):
+            setup, run = make(ds, work)
+            run(setup())
+
+
+def stage_findings_for_pr(ds, work):
+    # индекс находок и сопоставление с добавленными строками всех PR
+    def setup():
+        ensure_findings(ds, work)
+        reports = os.path.join(work, "reports")
+        return ef.load_findings(os.path.join(reports, "detekt_findings")) + ef.load_findings(os.path.join(reports, "ktlint_findings"))
+
+    def run(findings):
+        idx = ef.index_findings(findings)
+        return [ef.lookup_findings(idx, r["files"]) for r in ds.records]
+    return setup, run
+
+
+def stage_score_columns(ds, work):
+    def setup():
+        rnd = random.Random(len(ds.records))
+        n = len(ds.records)
+        return {k: [rnd.random() * 100 for _ in range(n)] for k in ("ci_fail", "ci_dur", "sa", "size", "spread", "hot")}
+    return setup, ef.score_columns
+
+
+def stage_extract_features(ds, work):
+    # extract_features.main целиком: чтение data/raw, находки, признаки, скоринг, запись дашборда
+    def setup():
+        ensure_findings(ds, work)
+
+    def run(_):
+        ef.main(work)
+    return setup, run
+
+
+# порядок важен: parse_* пишут файлы находок, которые читают findings_for_pr и extract_features
+STAGES = [
+    ("list_files", stage_list_files),
+    ("compute_hot", stage_compute_hot),
+    ("aggregate_ci", stage_aggregate_ci),
+    ("aggregate_ci_for_pr", stage_aggregate_ci_for_pr),
+    ("parse_detekt", stage_parse_detekt),
+    ("parse_detekt_xml", stage_parse_detekt_xml),
+    ("parse_ktlint", stage_parse_ktlint),
+    ("findings_for_pr", stage_findings_for_pr),
+    ("score_columns", stage_score_columns),
+    ("extract_features", stage_extract_features),
+]
+
+
+def measure(setup, run, repeat, memory):
+    """Время — лучшее из repeat прогонов без трассировки; память — пик tracemalloc отдельного прогона."""
+    best = None
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        t0 = time.perf_counter()
+        run(args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+        del args
+    res = {"seconds": round(best, 4)}
+    if memory:
+        args = setup()
+        gc.collect()
+        tracemalloc.start()
+        run(args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        res["peak_mb"] = round(peak / 1024 / 1024, 2)
+    return res
+
+
+def run_scale(scale, stages, repeat, memory, seed):
+    work = tempfile.mkdtemp(prefix=f"bench{scale}x-")
+    try:
+        t0 = time.perf_counter()
+        ds = Dataset(scale, seed)
+        ds.write(work)
+        print(f"[{scale}x] dataset: {len(ds.prs)} PRs, {sum(len(r['files']) for r in ds.records)} files, "
+              f"{len(ds.runs_payload)} CI runs, {ds.n_detekt}+{ds.n_ktlint} findings ({time.perf_counter() - t0:.1f}s)")
+        get_paged = fg.get_paged
+        out = {}
+        try:
+            for name, make in STAGES:
+                if stages and name not in stages:
+                    continue
+                setup, run = make(ds, work)
+                out[name] = measure(setup, run, repeat, memory)
+                print(f"[{scale}x] {name:22s} {out[name]['seconds']:9.3f}s" +
+                      (f" {out[name]['peak_mb']:9.1f} MB" if memory else ""))
+        finally:
+            fg.get_paged = get_paged
+        return out
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance, min_sec, min_mb):
+    """
+    Регрессия — рост больше чем на tolerance относительно baseline и больше абсолютного порога
+    (min_sec/min_mb), чтобы шум на миллисекундных шагах не давал ложных срабатываний.
+    """
+    flags = []
+    for scale, stages in results.items():
+        for name, cur in stages.items():
+            base = baseline.get(scale, {}).get(name)
+            if not base:
+                continue
+            for key, floor in (("seconds", min_sec), ("peak_mb", min_mb)):
+                if key not in cur or key not in base:
+                    continue
+                if cur[key] > base[key] * (1 + tolerance) and cur[key] - base[key] > floor:
+                    flags.append({"scale": scale, "stage": name, "metric": key, "baseline": base[key], "current": cur[key],
+                                  "ratio": round(cur[key] / base[key], 2) if base[key] else None})
+    return flags
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default="1,10")          # 100 — порядка 20 тыс. PR, нужно несколько ГБ памяти
+    ap.add_argument("--stages", default=None)            # через запятую; по умолчанию все
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no_memory", action="store_true")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default="data/derived/bench_results.json")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--update_baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--min_sec", type=float, default=0.05)
+    ap.add_argument("--min_mb", type=float, default=2.0)
+    args = ap.parse_args()
+
+    stages = set(args.stages.split(",")) if args.stages else None
+    results = {}
+    for s in args.scales.split(","):
+        scale = float(s) if "." in s else int(s)
+        results[f"{scale}x"] = run_scale(scale, stages, args.repeat, not args.no_memory, args.seed)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved.get("results", {})
+        if saved.get("host") != platform.node():
+            # baseline снят на другой машине: сравнивается только память, время — после --update_baseline здесь
+            print(f"{args.baseline}: recorded on {saved.get('host') or 'another machine'}, timings not compared")
+            baseline = {sc: {n: {k: v for k, v in r.items() if k != "seconds"} for n, r in st.items()} for sc, st in baseline.items()}
+    flags = compare(results, baseline, args.tolerance, args.min_sec, args.min_mb)
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "host": platform.node(),
+        "seed": args.seed,
+        "results": results,
+        "regressions": flags,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(args.out)
+    if args.update_baseline:
+        # дополняем baseline: масштабы и шаги, которых в этом прогоне не было, остаются прежними
+        for scale, st in results.items():
+            baseline.setdefault(scale, {}).update(st)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in report.items() if k != "regressions"} | {"results": baseline}, f, ensure_ascii=False, indent=2)
+        print(f"baseline updated: {args.baseline}")
+        return
+    for fl in flags:
+        print(f"REGRESSION {fl['scale']} {fl['stage']} {fl['metric']}: {fl['baseline']} -> {fl['current']} (x{fl['ratio']})")
+    if flags:
+        sys.exit(f"{len(flags)} regression(s) against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
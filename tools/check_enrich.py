@@ -0,0 +1,81 @@
+import os, sys, argparse, json, time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import enrich_semantics as es
+
+SLOW_TITLE = "slow PR"
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """
+    Подмена /api/generate: отвечает валидным JSON сразу, а на промпт с SLOW_TITLE — после delay секунд.
+    Считает TCP-соединения: при переиспользовании их не больше числа воркеров (плюс переподключения после таймаута).
+    """
+
+    protocol_version = "HTTP/1.1"
+    delay = 3.0
+    connections = 0
+    requests = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeOllama.lock:
+            FakeOllama.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        with FakeOllama.lock:
+            FakeOllama.requests += 1
+        if SLOW_TITLE in body["prompt"]:
+            time.sleep(self.delay)
+        resp = {"semText": "Изменён разбор. Возможна регрессия.", "semCategory": "Общее", "semScore": 0.5}
+        out = json.dumps({"response": json.dumps(resp, ensure_ascii=False), "prompt_eval_count": 10, "eval_count": 5}).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+        except (BrokenPipeError, ConnectionResetError):
+            # клиент уже ушёл по таймауту
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=40)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--timeout", type=float, default=1.0)   # меньше задержки медленного ответа
+    args = ap.parse_args()
+
+    FakeOllama.delay = args.timeout * 3
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    prs = [{"number": i + 1, "title": SLOW_TITLE if i == 0 else f"PR {i + 1}", "score": 1.0 - i / args.n} for i in range(args.n)]
+    try:
+        out = es.enrich_all(prs, url, "fake", workers=args.workers, timeout=args.timeout)
+    finally:
+        server.shutdown()
+
+    slow = [pr for pr in out if pr["title"] == SLOW_TITLE]
+    rest = [pr for pr in out if pr["title"] != SLOW_TITLE]
+    if slow[0]["semOrigin"] != "rule":
+        sys.exit(f"slow PR: semOrigin={slow[0]['semOrigin']}, expected rule")
+    bad = [pr["number"] for pr in rest if pr["semOrigin"] != "llm"]
+    if bad:
+        sys.exit(f"not enriched: {bad}")
+    # таймаут закрывает соединение одного воркера — не больше одного переподключения сверх пула
+    if FakeOllama.connections > args.workers + 1:
+        sys.exit(f"{FakeOllama.connections} connections for {FakeOllama.requests} requests: keep-alive not reused")
+    print(json.dumps({"prs": len(out), "requests": FakeOllama.requests, "connections": FakeOllama.connections}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os, sys, argparse, json, tempfile, threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fetch_prs
+
+
+def iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def synthetic_prs(n, since_days):
+    """
+    Merged PR по убыванию updated_at: у части есть ревью, у части только комментарий, у части ничего;
+    последние смержены раньше окна since_days — их оба бэкенда должны отбросить.
+    """
+    now = datetime.now(timezone.utc)
+    out = []
+    for i in range(n):
+        updated = now - timedelta(hours=6 * i + 1)
+        merged = updated - timedelta(hours=2) if i < n - 5 else now - timedelta(days=since_days + 1)
+        created = merged - timedelta(hours=30 + i)
+        review = iso(created + timedelta(hours=1 + i % 7)) if i % 3 == 0 else None
+        comment = iso(created + timedelta(minutes=30 + 10 * i)) if i % 3 != 2 else None
+        out.append({
+            "number": 1000 + i, "title": f"Fix parser #{i}" if i % 2 else f"Add API endpoint {i}",
+            "login": f"dev{i % 4}", "created": iso(created), "merged": iso(merged), "updated": iso(updated),
+            "additions": 10 * i + 3, "deletions": 5 * (i % 11), "files": 1 + i % 25,
+            "reviews": [review] if review else [], "comments": [comment] if comment else [],
+        })
+    return out
+
+
+def graphql_node(p):
+    return {
+        "number": p["number"], "title": p["title"], "url": f"https://github.com/o/n/pull/{p['number']}",
+        "createdAt": p["created"], "mergedAt": p["merged"], "updatedAt": p["updated"],
+        "additions": p["additions"], "deletions": p["deletions"], "changedFiles": p["files"],
+        "author": {"login": p["login"]},
+        "reviews": {"nodes": [{"submittedAt": x} for x in p["reviews"]]},
+        "comments": {"nodes": [{"createdAt": x} for x in p["comments"]]},
+    }
+
+
+def rest_expected(prs, since_days):
+    """Те же PR так, как их собирает REST-цикл fetch_prs.main: pulls/{n}, затем reviews, затем комментарии."""
+    since_dt = datetime.now(timezone.utc) - timedelta(days=since_days)
+    out = []
+    for p in prs:
+        full = {"number": p["number"], "title": p["title"], "html_url": f"https://github.com/o/n/pull/{p['number']}",
+                "user": {"login": p["login"]}, "created_at": p["created"], "merged_at": p["merged"],
+                "updated_at": p["updated"], "additions": p["additions"], "deletions": p["deletions"], "changed_files": p["files"]}
+        if fetch_prs.iso_to_dt(full["merged_at"]) < since_dt:
+            continue
+        triage_dt = fetch_prs.iso_to_dt(min(p["reviews"], default=None)) or fetch_prs.iso_to_dt(min(p["comments"], default=None))
+        out.append(fetch_prs.build_pr(full, fetch_prs.hours_between(fetch_prs.iso_to_dt(full["created_at"]), triage_dt)))
+    return sorted(out, key=lambda x: x["score"], reverse=True)
+
+
+class FakeGraphQL(BaseHTTPRequestHandler):
+    """Подмена /graphql: страницы pullRequests по first/after, курсор — смещение в списке."""
+
+    prs = []
+    queries = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        v = body["variables"]
+        FakeGraphQL.queries += 1
+        start = int(v["after"] or 0)
+        page = FakeGraphQL.prs[start:start + v["first"]]
+        end = start + len(page)
+        data = {"repository": {"pullRequests": {
+            "pageInfo": {"hasNextPage": end < len(FakeGraphQL.prs), "endCursor": str(end)},
+            "nodes": [graphql_node(p) for p in page],
+        }}} if (v["owner"], v["name"]) == ("o", "n") else None
+        out = json.dumps({"data": data} if data else {"errors": [{"message": "repository not found"}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=70)   # больше одной страницы (page_size=50)
+    ap.add_argument("--since_days", type=int, default=180)
+    args = ap.parse_args()
+
+    FakeGraphQL.prs = synthetic_prs(args.n, args.since_days)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGraphQL)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    work = tempfile.mkdtemp(prefix="check-graphql-")
+    out = os.path.join(work, "prs.json")
+    try:
+        fetch_prs.main(["--repo", "o/n", "--out", out, "--backend", "graphql", "--no_cache", "--limit", str(args.n * 2),
+                        "--since_days", str(args.since_days), "--config", os.path.join(work, "config.json"),
+                        "--graphql_url", f"http://127.0.0.1:{server.server_address[1]}/graphql"])
+    finally:
+        server.shutdown()
+    with open(out, "r", encoding="utf-8") as f:
+        got = json.load(f)["prs"]
+
+    # сверка схемы и значений с REST-путём: обе ветки собирают записи через build_pr
+    ref = rest_expected(FakeGraphQL.prs, args.since_days)
+    if json.dumps(got, sort_keys=True) != json.dumps(ref, sort_keys=True):
+        i = next((i for i, (a, b) in enumerate(zip(got, ref)) if a != b), min(len(got), len(ref)))
+        sys.exit(f"parity FAILED: {len(got)} vs {len(ref)} PRs, first mismatch at position {i}")
+    pages = -(-args.n // 50)
+    if FakeGraphQL.queries != pages:
+        sys.exit(f"{FakeGraphQL.queries} queries for {args.n} PRs, expected {pages}")
+    print(json.dumps({"prs": len(got), "queries": FakeGraphQL.queries}))
+
+
+if __name__ == "__main__":
+    main()
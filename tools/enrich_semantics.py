@@ -1,6 +1,81 @@
-import json, http.client, argparse, math
+import json, http.client, argparse, math, re, os, sys, time, threading, hashlib, heapq
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
 from urllib.parse import urlparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dashboard_pages import write_pages
+from metrics import METRICS
+
+# keep-alive соединение на поток: воркеры пула не открывают TCP на каждый PR
+_local = threading.local()
+
+OPTIONS = {"temperature": 0.1, "top_p": 0.9}
+# В пакетном режиме (batch.py) — общий семафор менеджера: сколько запросов к Ollama одновременно
+# на все репозитории сразу. None — ограничивает только --workers этого процесса.
+LLM_SLOTS = None
+# токены промпта и генерации по ответам Ollama — для бюджета --budget_tokens
+USAGE = {"tokens": 0}
+_usage_lock = threading.Lock()
+# Версия шаблона build_prompt: при правке формулировок увеличить —
+# записи кэша с другой версией отбрасываются при загрузке.
+PROMPT_VERSION = 1
+
+class LLMCache:
+    """
+    Кэш результатов LLM по хэшу (версия шаблона, модель, текст промпта, опции).
+    Хранит только semText/semCategory/semScore; при превышении max_entries
+    вытесняются давно не использованные записи.
+    """
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = {k: v for k, v in json.load(f).items() if v.get("v") == PROMPT_VERSION}
+
+    @staticmethod
+    def key(model, prompt):
+        raw = json.dumps([PROMPT_VERSION, model, prompt, OPTIONS], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            e = self.data.get(key)
+            if e is None:
+                self.misses += 1
+                METRICS.inc("llm_cache_total", result="miss")
+                return None
+            self.hits += 1
+            METRICS.inc("llm_cache_total", result="hit")
+            e["used"] = time.time()
+            return e["result"]
+
+    def put(self, key, result):
+        with self._lock:
+            self.data[key] = {"v": PROMPT_VERSION, "used": time.time(), "result": result}
+
+    def clear(self):
+        with self._lock:
+            self.data = {}
+
+    def save(self):
+        with self._lock:
+            keep = sorted(self.data.items(), key=lambda kv: kv[1]["used"], reverse=True)[:self.max_entries]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dict(keep), f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def report(self):
+        print(f"llm cache: hits={self.hits} misses={self.misses} entries={len(self.data)}", file=sys.stderr)
+
 def clamp01(x):
     try:
         v = float(x)
@@ -8,21 +83,52 @@ def clamp01(x):
         return 0.0
     return 0.0 if v < 0 else 1.0 if v > 1 else v
 
-def call_ollama(url, model, prompt):
+def _connection(u, timeout):
+    c = getattr(_local, "conn", None)
+    if c is None or (c.host, c.port) != (u.hostname, u.port or 80):
+        if c is not None:
+            c.close()
+        c = http.client.HTTPConnection(u.hostname, u.port, timeout=timeout)
+        _local.conn = c
+    c.timeout = timeout
+    if c.sock is not None:
+        c.sock.settimeout(timeout)
+    return c
+
+def _post(u, body, timeout):
+    # сервер мог закрыть простаивающее keep-alive соединение — тогда один раз переподключаемся
+    for attempt in (0, 1):
+        c = _connection(u, timeout)
+        try:
+            c.request("POST", u.path, body=body, headers={"Content-Type": "application/json"})
+            r = c.getresponse()
+            return r.read().decode("utf-8")
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            c.close()
+            _local.conn = None
+            if attempt:
+                raise
+        except Exception:
+            c.close()
+            _local.conn = None
+            raise
+
+def call_ollama(url, model, prompt, timeout=600):
     u = urlparse(url)
     body = json.dumps({
         "model": model,
         "prompt": prompt,
         "format": "json",
-        "options": {"temperature": 0.1, "top_p": 0.9},
+        "options": OPTIONS,
         "stream": False
     })
-    c = http.client.HTTPConnection(u.hostname, u.port, timeout=600)
-    c.request("POST", u.path, body=body, headers={"Content-Type": "application/json"})
-    r = c.getresponse()
-    d = r.read().decode("utf-8")
-    c.close()
+    with METRICS.timer("llm_request_seconds", model=model):
+        d = _post(u, body, timeout)
     o = json.loads(d)
+    tokens = int(o.get("prompt_eval_count") or 0) + int(o.get("eval_count") or 0)
+    with _usage_lock:
+        USAGE["tokens"] += tokens
+    METRICS.inc("llm_tokens_total", tokens, model=model)
     resp = o.get("response", "")
     try:
         return json.loads(resp)
@@ -47,8 +153,21 @@ def build_prompt(pr):
         f"Заголовок: {title}\nФайлов: {files}\nДобавлено строк: {add}\nУдалено строк: {dele}\nИндекс: {score:.2f}\n"
     )
 
-def enrich(pr, url, model):
-    j = call_ollama(url, model, build_prompt(pr))
+def enrich(pr, url, model, timeout=600, cache=None):
+    prompt = build_prompt(pr)
+    key = cache.key(model, prompt) if cache is not None else None
+    j = cache.get(key) if cache is not None else None
+    cached = j is not None
+    if not cached:
+        # таймаут, обрыв или мусор в ответе не валят прогон: PR остаётся с семантикой из правила.
+        # Мусор бывает любой формы (JSON не-объект, числа строками, null вместо ответа) — отсюда
+        # AttributeError/TypeError/KeyError при разборе, поэтому ловим всё, а не только сетевые ошибки
+        try:
+            with LLM_SLOTS if LLM_SLOTS is not None else nullcontext():
+                j = call_ollama(url, model, prompt, timeout)
+        except Exception as e:
+            METRICS.inc("llm_errors_total", model=model, error=type(e).__name__)
+            j = None
     if isinstance(j, dict) and {"semText","semCategory","semScore"} <= set(j.keys()):
         pr["semText"] = str(j["semText"])[:400]
         pr["semCategory"] = str(j["semCategory"])[:40]
@@ -59,9 +178,14 @@ def enrich(pr, url, model):
             s = 0.0
         pr["semScore"] = 0.0 if s < 0 else 1.0 if s > 1 else s
         pr["semOrigin"] = "llm"
+        if cache is not None and not cached:
+            cache.put(key, {k: pr[k] for k in ("semText", "semCategory", "semScore")})
     else:
         pr["semOrigin"] = "rule"
+    METRICS.inc("llm_enriched_total", origin=pr["semOrigin"])
+    return rescore(pr)
 
+def rescore(pr):
     # <<< НОВОЕ: пересчитываем ИТОГОВЫЙ ИНДЕКС >>>
     dn = float(pr.get("diff_norm") or 0.0)
     sn = float(pr.get("spread_norm") or 0.0)
@@ -71,23 +195,92 @@ def enrich(pr, url, model):
 
     return pr
 
-def main():
+def enrich_all(prs, url, model, workers=4, timeout=600, cache=None, budget_sec=None, budget_tokens=None):
+    """
+    PR обрабатываются по убыванию score до LLM (очередь с приоритетом), не больше workers одновременно.
+    Когда исчерпан бюджет по времени (budget_sec) или токенам (budget_tokens), новые запросы не отправляются:
+    уже отправленные дорабатывают (таймаут каждого не выходит за остаток бюджета), остальные — semOrigin "rule".
+    """
+    t0 = time.time()
+    deadline = t0 + budget_sec if budget_sec else None
+    tokens0 = USAGE["tokens"]
+    out = [None] * len(prs)
+    queue = [(-float(pr.get("score") or 0.0), i) for i, pr in enumerate(prs)]
+    heapq.heapify(queue)
+
+    def exhausted():
+        if deadline is not None and time.time() >= deadline:
+            return True
+        return budget_tokens is not None and USAGE["tokens"] - tokens0 >= budget_tokens
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        running = {}
+        while queue or running:
+            while queue and len(running) < max(1, workers) and not exhausted():
+                _, i = heapq.heappop(queue)
+                t = timeout if deadline is None else max(1.0, min(timeout, deadline - time.time()))
+                running[ex.submit(enrich, dict(prs[i]), url, model, t, cache)] = i
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                i = running.pop(fut)
+                out[i] = fut.result()
+                done += 1
+                print(f"[{done}/{len(prs)}] #{out[i].get('number')} {out[i]['semOrigin']} {time.time() - t0:.0f}s", file=sys.stderr)
+    skipped = 0
+    for _, i in queue:
+        pr = dict(prs[i])
+        pr["semOrigin"] = "rule"
+        out[i] = rescore(pr)
+        skipped += 1
+    elapsed = time.time() - t0
+    llm = sum(1 for pr in out if pr["semOrigin"] == "llm")
+    METRICS.set("llm_budget_skipped_prs", skipped)
+    print(f"enriched {llm} PRs via llm in {elapsed:.0f}s ({llm / elapsed if elapsed else 0:.2f} PR/s), "
+          f"{skipped} left on rule by budget, tokens={USAGE['tokens'] - tokens0}", file=sys.stderr)
+    return out
+
+def main(argv=None):
     ap = argparse.ArgumentParser()
     ap.add_argument("--in", dest="inp", required=True)
     ap.add_argument("--out", required=True)
     ap.add_argument("--ollama_url", default="http://127.0.0.1:11434/api/generate")
     ap.add_argument("--model", default="llama3.1:8b-instruct-q4_K_M")
-    args = ap.parse_args()
-    data = json.load(open(args.inp, "r", encoding="utf-8"))
+    ap.add_argument("--workers", type=int, default=4)      # одновременных запросов к Ollama
+    ap.add_argument("--timeout", type=float, default=600)  # секунд на один запрос, дальше — fallback на rule
+    ap.add_argument("--cache", default="data/cache/llm_cache.json")  # результаты LLM между запусками
+    ap.add_argument("--cache_max", type=int, default=5000)
+    ap.add_argument("--no_cache", action="store_true")
+    ap.add_argument("--invalidate_cache", action="store_true")      # сбросить кэш целиком перед прогоном
+    ap.add_argument("--budget_sec", type=float, default=None)       # бюджет по времени на весь прогон
+    ap.add_argument("--budget_tokens", type=int, default=None)      # бюджет по токенам Ollama
+    ap.add_argument("--pages_dir", default=None)    # сводка + страницы по score для index.html (dashboard_pages)
+    ap.add_argument("--page_size", type=int, default=200)
+    ap.add_argument("--max_pages", type=int, default=None)
+    args = ap.parse_args(argv)
+    cache = None if args.no_cache else LLMCache(args.cache, args.cache_max)
+    if cache is not None and args.invalidate_cache:
+        cache.clear()
+    with open(args.inp, "r", encoding="utf-8") as f:
+        data = json.load(f)
     prs = data.get("prs") if isinstance(data, dict) else data
-    out = [enrich(dict(pr), args.ollama_url, args.model) for pr in prs]
+    out = enrich_all(prs, args.ollama_url, args.model, args.workers, args.timeout, cache,
+                     budget_sec=args.budget_sec, budget_tokens=args.budget_tokens)
+    if cache is not None:
+        cache.save()
+        cache.report()
     out.sort(key=lambda x: x.get("score", 0.0), reverse=True)
     if isinstance(data, dict):
         data["prs"] = out
-        json.dump(data, open(args.out, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
-    else:
-        json.dump(out, open(args.out, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(data if isinstance(data, dict) else out, f, ensure_ascii=False, indent=2)
     print(args.out)
+    if args.pages_dir:
+        write_pages(out, args.pages_dir, args.page_size, args.max_pages)
+        print(args.pages_dir)
 
 if __name__ == "__main__":
     main()
+    METRICS.write()
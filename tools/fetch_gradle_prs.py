@@ -1,17 +1,28 @@
-import os, sys, argparse, json, time, math, re
+import os, sys, argparse, json, math, re
 from datetime import datetime, timedelta, timezone
 from dateutil import parser as dtp
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_cache import HttpCache
+from rate_limit import RateLimiter
+from metrics import METRICS
+from fetch_prs import read_config
+
+CACHE = None
+LIMITER = RateLimiter([])
+
+def http_get(url, params, headers):
+    if CACHE is not None:
+        return CACHE.request(requests.get, url, params=params, headers=headers, timeout=60)
+    return requests.get(url, params=params, headers=headers, timeout=60)
+
 def gh_get(url, params=None, token=None):
-    h = {"Accept": "application/vnd.github+json"}
-    if token: h["Authorization"] = f"Bearer {token}"
-    r = requests.get(url, params=params or {}, headers=h, timeout=60)
-    if r.status_code == 403 and "rate limit" in r.text.lower():
-        reset = r.headers.get("X-RateLimit-Reset")
-        wait = max(0, int(reset) - int(time.time())) + 1 if reset else 60
-        time.sleep(wait)
-        r = requests.get(url, params=params or {}, headers=h, timeout=60)
+    def send(tok):
+        h = {"Accept": "application/vnd.github+json"}
+        if tok or token: h["Authorization"] = f"Bearer {tok or token}"
+        return http_get(url, params or {}, h)
+    r = LIMITER.send(send)
     r.raise_for_status()
     return r.json()
 
@@ -41,8 +52,15 @@ def main():
     ap.add_argument("--since_days", type=int, default=90)
     ap.add_argument("--limit", type=int, default=250)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--cache_dir", default="data/cache/http")
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--no_cache", action="store_true")
     args = ap.parse_args()
 
+    global CACHE, LIMITER
+    if not args.no_cache: CACHE = HttpCache(args.cache_dir)
+    LIMITER = RateLimiter.from_env(read_config(args.config), name="fetch_gradle_prs")
+
     token = os.environ.get("GITHUB_TOKEN", "").strip() or None
     owner, name = args.repo.split("/", 1)
     since_dt = datetime.now(timezone.utc) - timedelta(days=args.since_days)
@@ -115,6 +133,10 @@ def main():
     data = {"prs": sorted(prs, key=lambda x: x["score"], reverse=True)}
     with open(args.out, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    if CACHE is not None:
+        CACHE.prune(); CACHE.report()
+    LIMITER.report()
 
 if __name__ == "__main__":
     main()
+    METRICS.write()
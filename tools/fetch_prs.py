@@ -1,33 +1,61 @@
-import os, argparse, json, time, re
+import os, sys, argparse, json, re
 from datetime import datetime, timedelta, timezone
 from dateutil import parser as dtp
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_cache import HttpCache
+from rate_limit import RateLimiter
+from metrics import METRICS
+from gh_graphql import GRAPHQL_URL, iter_merged_prs
+
+def read_config(path):
+    # конфигурация необязательна: скрипт запускают и отдельно, вне каталога проекта
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# Дисковый кэш условных запросов; None — кэш выключен (--no_cache).
+CACHE = None
+# Общий планировщик лимитов: пейсинг, Retry-After, повторы с backoff, пул токенов из GITHUB_TOKENS.
+LIMITER = RateLimiter([])
+
+
+def http_get(url, params, headers):
+    if CACHE is not None:
+        return CACHE.request(requests.get, url, params=params, headers=headers, timeout=60)
+    return requests.get(url, params=params, headers=headers, timeout=60)
+
 
 def gh_get(url, params=None, token=None):
     """
     Обёртка над GET к GitHub REST API
-    GitHub иногда возвращает 403 при исчерпании лимита.
+    Ожидание лимитов и повторы — в LIMITER; токен из пула имеет приоритет над переданным.
     60 секунд на запрос — безопасный верх для редких «тяжёлых» эндпоинтов.
     """
-    h = {"Accept": "application/vnd.github+json"}
-    if token:
-        h["Authorization"] = f"Bearer {token}"
-
-    r = requests.get(url, params=params or {}, headers=h, timeout=60)
-
-    # Если 403 и текст про rate limit — дожидаемся конца окна и повторяем ровно один раз.
-    if r.status_code == 403 and "rate limit" in r.text.lower():
-        reset = r.headers.get("X-RateLimit-Reset")
-        # ждём до конца окна +1 сек для надёжности, если заголовка нет — ждём 60с
-        wait = max(0, int(reset) - int(time.time())) + 1 if reset else 60
-        time.sleep(wait)
-        r = requests.get(url, params=params or {}, headers=h, timeout=60)
+    def send(tok):
+        h = {"Accept": "application/vnd.github+json"}
+        if tok or token:
+            h["Authorization"] = f"Bearer {tok or token}"
+        return http_get(url, params or {}, h)
 
+    r = LIMITER.send(send)
     r.raise_for_status()  # пусть падает шумно и рано — проще отлаживать
     return r.json()
 
 
+def load_state(path):
+    """
+    Состояние инкрементального сбора (high-water mark по updated_at).
+    Нет файла — значит, это первый запуск и собираем окно целиком.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
 def iso_to_dt(x):
     """
     Преобразование ISO-8601 строки datetime.
@@ -76,7 +104,86 @@ def sem_text(title, files, add, dele, score):
     return f"{title}. Файлов {files}, добавлено {add}, удалено {dele}. Индекс {round(score,2)}."
 
 
-def main():
+def build_pr(full, triage):
+    """
+    Запись prs.json из REST-объекта PR (или приведённого к нему узла GraphQL) и triage в часах.
+    Общая для обоих бэкендов, чтобы схема выхода не расходилась.
+    """
+    # Базовые объёмы: строки и число файлов.
+    additions = int(full.get("additions") or 0)
+    deletions = int(full.get("deletions") or 0)
+    files_changed = int(full.get("changed_files") or 0)
+
+    # НОРМИРОВАНИЕ ФАКТОРОВ (0..1)
+    # Выбираем простые min–max-пороговые шкалы, чтобы держать «типичный» PR в середине шкалы.
+    # 2000 строк как «единица» для diff_norm
+    diff_norm = min(1.0, (additions + deletions) / 2000.0)
+
+    # 20 файлов как «единица» для spread_norm:
+    # изменение в 20+ файлах почти всегда означает массовую правку.
+    spread_norm = min(1.0, files_changed / 20.0)
+
+    # «Горячесть» как прокси через число файлов (верхняя полка - 15)
+    hot_norm = min(1.0, files_changed / 15.0)
+
+    # Семантическая оценка на этом шаге — из правила, не LLM.
+    # Делаем её зависимой от масштаба и распылённости поровну (0.5/0.5), чтобы
+    # не перетягивать одеяло в сторону текста до подключения LLM.
+    semScore = min(1.0, 0.5 * diff_norm + 0.5 * spread_norm)
+
+    # --- ИНДЕКС ---
+    # Фиксированные веса: размер (0.40), распылённость (0.30), горячесть (0.10), семантика (0.20).
+    score = 0.40 * diff_norm + 0.30 * spread_norm + 0.10 * hot_norm + 0.20 * semScore
+
+    return {
+        "number": full["number"],
+        "title": full.get("title") or "",
+        "url": full.get("html_url"),
+        "author": (full.get("user") or {}).get("login"),
+        "created_at": full.get("created_at"),
+        "merged_at": full.get("merged_at"),
+        "lines_added": additions,
+        "lines_deleted": deletions,
+        "files_changed": files_changed,
+        "diff_norm": round(diff_norm, 4),
+        "spread_norm": round(spread_norm, 4),
+        "hot_norm": round(hot_norm, 4),
+        "semScore": round(semScore, 4),
+        "score": round(score, 4),
+        "triage": round(triage, 2),
+        "problem": None,  # ретро-разметка инцидентов в демо отсутствует => KPI будут «н/д»
+        "semCategory": categorize(full.get("title") or ""),
+        "semText": sem_text(full.get("title") or "", files_changed, additions, deletions, score),
+        "semOrigin": "rule",  # помечаем источник семантики (rule|llm)
+    }
+
+
+def fetch_graphql(owner, name, token, url, since_dt, hwm, limit, newest):
+    """
+    GraphQL-бэкенд: страница из page_size merged PR приходит одним запросом вместе
+    с объёмами, первым ревью и первым комментарием — вместо до четырёх REST-вызовов на PR.
+    Порядок (updated_at по убыванию), фильтры и условия остановки те же, что у REST-цикла.
+    """
+    prs = []
+    for full in iter_merged_prs(owner, name, token=token, url=url, limiter=LIMITER):
+        if len(prs) >= limit:
+            break
+        updated_at = iso_to_dt(full["updated_at"])
+        if hwm is not None and updated_at <= hwm:
+            break
+        # merged_at <= updated_at, так что дальше по списку всё уже вне окна
+        if updated_at < since_dt:
+            break
+        if newest is None or updated_at > iso_to_dt(newest):
+            newest = full["updated_at"]
+        if iso_to_dt(full["merged_at"]) < since_dt:
+            continue
+        triage_dt = iso_to_dt(full["first_review_at"]) or iso_to_dt(full["first_comment_at"])
+        prs.append(build_pr(full, hours_between(iso_to_dt(full["created_at"]), triage_dt)))
+    return prs, newest
+
+
+def main(argv=None):
     """
     Основной сценарий:
     - читаем параметры;
@@ -93,15 +200,40 @@ def main():
     ap.add_argument("--since_days", type=int, default=180)   # окно по времени для merged_at
     ap.add_argument("--limit", type=int, default=250)        # верхняя граница записей для демо
     ap.add_argument("--out", required=True)                  # путь к dashboard.json
-    args = ap.parse_args()
+    ap.add_argument("--cache_dir", default="data/cache/http")  # кэш ETag/Last-Modified между запусками
+    ap.add_argument("--config", default="config.json")         # секция rate_limit, как у fetch_github
+    ap.add_argument("--no_cache", action="store_true")
+    ap.add_argument("--incremental", action="store_true")      # только PR, обновлённые после прошлого запуска
+    ap.add_argument("--state", default=None)                   # файл с high-water mark, по умолчанию рядом с --out
+    ap.add_argument("--backend", choices=("rest", "graphql"), default="rest")
+    ap.add_argument("--graphql_url", default=GRAPHQL_URL)      # можно направить на локальный стенд
+    args = ap.parse_args(argv)
+
+    global CACHE, LIMITER
+    if not args.no_cache:
+        CACHE = HttpCache(args.cache_dir)
+    cfg = read_config(args.config)
+    LIMITER = RateLimiter.from_env(cfg, name="fetch_prs")
 
     token = os.environ.get("GITHUB_TOKEN", "").strip() or None
     owner, name = args.repo.split("/", 1)
     since_dt = datetime.now(timezone.utc) - timedelta(days=args.since_days)
 
+    # Инкрементальный режим: помним updated_at самого свежего обработанного PR
+    # и при следующем запуске идём по страницам только до него.
+    state_path = args.state or os.path.splitext(args.out)[0] + "_state.json"
+    state = load_state(state_path) if args.incremental else {}
+    hwm = iso_to_dt(state.get("updated_at"))
+    # лимит в этом режиме не применяем: обрезанная дельта потерялась бы за high-water mark
+    limit = args.limit if hwm is None else float("inf")
+    newest = state.get("updated_at")
+
     prs = []
     page = 1
-    while len(prs) < args.limit:
+    done = False
+    if args.backend == "graphql":
+        prs, newest = fetch_graphql(owner, name, token, args.graphql_url, since_dt, hwm, limit, newest)
+    while args.backend == "rest" and len(prs) < limit and not done:
         # Берём закрытые PR, сортируем по обновлению (свежее наверху) и ходим по страницам.
         lst = gh_get(
             f"https://api.github.com/repos/{owner}/{name}/pulls",
@@ -112,8 +244,17 @@ def main():
             break
 
         for item in lst:
-            if len(prs) >= args.limit:
+            if len(prs) >= limit:
                 break
+            if hwm is not None and iso_to_dt(item["updated_at"]) <= hwm:
+                done = True
+                break
+            # как в fetch_graphql: merged_at <= updated_at, так что дальше по списку всё уже вне окна
+            if iso_to_dt(item["updated_at"]) < since_dt:
+                done = True
+                break
+            if newest is None or iso_to_dt(item["updated_at"]) > iso_to_dt(newest):
+                newest = item["updated_at"]
 
             num = item["number"]
 
@@ -144,62 +285,30 @@ def main():
 
             triage = hours_between(created_at, triage_dt)
 
-            # Базовые объёмы: строки и число файлов.
-            additions = int(full.get("additions") or 0)
-            deletions = int(full.get("deletions") or 0)
-            files_changed = int(full.get("changed_files") or 0)
-
-            # НОРМИРОВАНИЕ ФАКТОРОВ (0..1)
-            # Выбираем простые min–max-пороговые шкалы, чтобы держать «типичный» PR в середине шкалы.
-            # 2000 строк как «единица» для diff_norm
-            diff_norm = min(1.0, (additions + deletions) / 2000.0)
-
-            # 20 файлов как «единица» для spread_norm:
-            # изменение в 20+ файлах почти всегда означает массовую правку.
-            spread_norm = min(1.0, files_changed / 20.0)
-
-            # «Горячесть» как прокси через число файлов (верхняя полка - 15)
-            hot_norm = min(1.0, files_changed / 15.0)
-
-            # Семантическая оценка на этом шаге — из правила, не LLM.
-            # Делаем её зависимой от масштаба и распылённости поровну (0.5/0.5), чтобы
-            # не перетягивать одеяло в сторону текста до подключения LLM.
-            semScore = min(1.0, 0.5 * diff_norm + 0.5 * spread_norm)
-
-            # --- ИНДЕКС ---
-            # Фиксированные веса: размер (0.40), распылённость (0.30), горячесть (0.10), семантика (0.20).
-            score = 0.40 * diff_norm + 0.30 * spread_norm + 0.10 * hot_norm + 0.20 * semScore
-
-            prs.append({
-                "number": num,
-                "title": full.get("title") or "",
-                "url": full.get("html_url"),
-                "author": (full.get("user") or {}).get("login"),
-                "created_at": full.get("created_at"),
-                "merged_at": full.get("merged_at"),
-                "lines_added": additions,
-                "lines_deleted": deletions,
-                "files_changed": files_changed,
-                "diff_norm": round(diff_norm, 4),
-                "spread_norm": round(spread_norm, 4),
-                "hot_norm": round(hot_norm, 4),
-                "semScore": round(semScore, 4),
-                "score": round(score, 4),
-                "triage": round(triage, 2),
-                "problem": None,  # ретро-разметка инцидентов в демо отсутствует => KPI будут «н/д»
-                "semCategory": categorize(full.get("title") or ""),
-                "semText": sem_text(full.get("title") or "", files_changed, additions, deletions, score),
-                "semOrigin": "rule",  # помечаем источник семантики (rule|llm)
-            })
+            prs.append(build_pr(full, triage))
 
         page += 1
 
     # Готовим выход: сортировка по score облегчает отрисовку очереди на витрине.
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    if hwm is not None and os.path.exists(args.out):
+        # Сливаем дельту с прошлым результатом по номеру PR; вышедшее за окно отбрасываем.
+        with open(args.out, "r", encoding="utf-8") as f:
+            prev = json.load(f).get("prs", [])
+        nums = {p["number"] for p in prs}
+        prs += [p for p in prev if p["number"] not in nums and iso_to_dt(p["merged_at"]) >= since_dt]
     data = {"prs": sorted(prs, key=lambda x: x["score"], reverse=True)}
     with open(args.out, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"updated_at": newest}, f)
+
+    if CACHE is not None:
+        CACHE.prune()
+        CACHE.report()
+    LIMITER.report()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    METRICS.write()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import requests
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Один запрос отдаёт страницу merged PR вместе со всем, что REST-сборщик
+# добирал отдельными вызовами: объёмы, даты, первое ревью и первый комментарий.
+MERGED_PRS_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(states: MERGED, first: $first, after: $after,
+                 orderBy: {field: UPDATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        number title url createdAt mergedAt updatedAt
+        additions deletions changedFiles
+        author { login }
+        reviews(first: 1) { nodes { submittedAt } }
+        comments(first: 1) { nodes { createdAt } }
+      }
+    }
+  }
+}
+"""
+
+
+def graphql(query, variables, token=None, url=GRAPHQL_URL, limiter=None):
+    """
+    POST к GraphQL API. Лимиты и повторы — через общий RateLimiter сборщика;
+    без него делаем один запрос. Ошибки уровня GraphQL (поле errors) поднимаем как RuntimeError.
+    """
+    body = {"query": query, "variables": variables}
+
+    def send(tok):
+        h = {"Accept": "application/vnd.github+json"}
+        if tok or token:
+            h["Authorization"] = f"Bearer {tok or token}"
+        return requests.post(url, json=body, headers=h, timeout=60)
+
+    r = limiter.send(send) if limiter is not None else send(None)
+    r.raise_for_status()
+    payload = r.json()
+    if payload.get("errors"):
+        raise RuntimeError(f"GraphQL error: {payload['errors'][0].get('message')}")
+    return payload["data"]
+
+
+def to_rest(node):
+    """
+    Приводит узел GraphQL к полям REST-объекта pulls/{num}, с которыми работают сборщики,
+    плюс first_review_at / first_comment_at для расчёта triage.
+    """
+    reviews = [x.get("submittedAt") for x in (node.get("reviews") or {}).get("nodes") or [] if x.get("submittedAt")]
+    comments = [x.get("createdAt") for x in (node.get("comments") or {}).get("nodes") or [] if x.get("createdAt")]
+    return {
+        "number": node["number"],
+        "title": node.get("title") or "",
+        "html_url": node.get("url"),
+        "user": {"login": (node.get("author") or {}).get("login")},
+        "created_at": node.get("createdAt"),
+        "merged_at": node.get("mergedAt"),
+        "updated_at": node.get("updatedAt"),
+        "additions": node.get("additions"),
+        "deletions": node.get("deletions"),
+        "changed_files": node.get("changedFiles"),
+        "first_review_at": min(reviews, default=None),
+        "first_comment_at": min(comments, default=None),
+    }
+
+
+def iter_merged_prs(owner, name, token=None, url=GRAPHQL_URL, page_size=50, limiter=None):
+    """
+    Merged PR репозитория, свежие по updated_at — первыми, страницами по page_size.
+    Генератор: вызывающий код сам решает, когда остановиться (лимит, окно, high-water mark).
+    """
+    after = None
+    while True:
+        data = graphql(
+            MERGED_PRS_QUERY,
+            {"owner": owner, "name": name, "first": page_size, "after": after},
+            token=token,
+            url=url,
+            limiter=limiter,
+        )
+        page = data["repository"]["pullRequests"]
+        for node in page["nodes"]:
+            yield to_rest(node)
+        if not page["pageInfo"]["hasNextPage"]:
+            break
+        after = page["pageInfo"]["endCursor"]
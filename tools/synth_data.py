@@ -0,0 +1,212 @@
+import os, sys, argparse, json, random, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from line_ranges import LineRanges
+
+# Объём 1x — как у нашего прогона по gradle/gradle: max_pr=200, ci_runs_limit=5000,
+# ~25 тыс. находок detekt (reports/detekt.xml) и несколько тысяч ktlint.
+BASE = {"prs": 200, "paths": 3000, "ci_runs": 5000, "detekt": 25000, "ktlint": 5000}
+MODULES = ["subprojects/core", "subprojects/dependency-management", "platforms/jvm/testing-jvm",
+           "platforms/documentation/docs", "platforms/core-runtime/launcher", "build-logic", "testing/smoke-test"]
+RULES = ["detekt.Indentation", "detekt.MaxLineLength", "detekt.CyclomaticComplexMethod",
+         "detekt.MagicNumber", "detekt.LongMethod", "detekt.UnusedPrivateMember", "detekt.TooManyFunctions"]
+KT_RULES = ["standard:indent", "standard:no-wildcard-imports", "standard:max-line-length", "standard:trailing-comma-on-call-site"]
+SEVERITIES = ["error", "warning", "info"]
+CONCLUSIONS = ["success"] * 7 + ["failure", "cancelled", "timed_out", None]
+
+
+def iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class Dataset:
+    """
+    Детерминированные синтетические входы конвейера в масштабе scale (1, 10, 100 ...):
+    REST-ответы GitHub (PR, файлы с patch, коммиты, прогоны Actions), записи pr_enriched,
+    отчёты detekt (checkstyle XML) и ktlint (JSON-строки). Распределения с тяжёлым хвостом:
+    немного «массовых миграций» на тысячи строк, горячие файлы, часть находок на добавленных строках.
+    Даты отсчитываются от anchor (по умолчанию — сегодняшняя полночь UTC), чтобы окно горячести 90 дней было заполнено.
+    """
+
+    def __init__(self, scale=1, seed=42, anchor=None):
+        self.scale = scale
+        self.rnd = random.Random(seed)
+        self.anchor = anchor or datetime.datetime.combine(datetime.date.today(), datetime.time())
+        n = {k: int(v * scale) for k, v in BASE.items()}
+        rnd = self.rnd
+        self.paths = [f"{rnd.choice(MODULES)}/src/main/kotlin/org/gradle/pkg{i % 97}/File{i}.kt" for i in range(n["paths"])]
+        self.prs = []             # элементы /pulls
+        self.files_payload = {}   # номер PR -> ответ /pulls/N/files
+        self.commits_payload = {} # номер PR -> ответ /pulls/N/commits
+        self.records = []         # pr_enriched.json
+        self.added = []           # (path, line) добавленных строк — часть находок кладём на них
+        for i in range(n["prs"]):
+            self._pr(30000 + i)
+        self.runs_payload = [self._run(j) for j in range(n["ci_runs"])]
+        self.n_detekt = n["detekt"]
+        self.n_ktlint = n["ktlint"]
+
+    def _sha(self):
+        return f"{self.rnd.getrandbits(160):040x}"
+
+    def _path(self):
+        # горячее ядро: 2% файлов пула получают треть всех правок
+        if self.rnd.random() < 0.33:
+            return self.paths[self.rnd.randrange(max(1, len(self.paths) // 50))]
+        return self.paths[self.rnd.randrange(len(self.paths))]
+
+    def _patch(self, migration):
+        rnd = self.rnd
+        lines = []
+        added = []
+        if migration:
+            n = rnd.randint(300, 2000)
+            lines.append(f"@@ -0,0 +1,{n} @@")
+            lines.extend("+" + "val x = 1" for _ in range(n))
+            return "\n".join(lines), list(range(1, n + 1)), n, 0
+        new_ln = rnd.randint(1, 40)
+        adds = dels = 0
+        for _ in range(rnd.randint(1, 5)):
+            ctx = rnd.randint(0, 3); a = rnd.randint(0, 12); d = rnd.randint(0, 6)
+            lines.append(f"@@ -{new_ln},{ctx * 2 + d} +{new_ln},{ctx * 2 + a} @@ class Foo {{")
+            body = [" ctx"] * ctx + ["-old()"] * d + ["+new()"] * a + [" ctx"] * ctx
+            for b in body:
+                lines.append("    " + b if b[0] == " " else b)
+                if b[0] == "+":
+                    added.append(new_ln)
+                if b[0] != "-":
+                    new_ln += 1
+            adds += a; dels += d
+            new_ln += rnd.randint(10, 120)
+        return "\n".join(lines), added, adds, dels
+
+    def _pr(self, num):
+        rnd = self.rnd
+        created = self.anchor - datetime.timedelta(days=rnd.uniform(0, 180))
+        merged = created + datetime.timedelta(hours=rnd.uniform(1, 240))
+        title = rnd.choice(["Fix", "Add", "Migrate", "Refactor", "Improve"]) + f" component {num % 311}"
+        self.prs.append({"number": num, "title": title, "created_at": iso(created), "merged_at": iso(merged),
+                         "updated_at": iso(merged), "state": "closed", "user": {"login": f"dev{num % 40}"}})
+        migration = rnd.random() < 0.01
+        files_p = []
+        files_r = []
+        seen = set()
+        for _ in range(min(3000, int(rnd.paretovariate(1.3) * 8))):
+            path = self._path()
+            if path in seen:
+                continue
+            seen.add(path)
+            patch, added, a, d = self._patch(migration)
+            files_p.append({"filename": path, "additions": a, "deletions": d, "changes": a + d, "status": "modified", "patch": patch})
+            files_r.append({"path": path, "add": a, "del": d, "added_ranges": LineRanges.from_lines(added).to_json()})
+            if rnd.random() < 0.3:
+                self.added.extend((path, ln) for ln in added[:5])
+        commits_p = []
+        for k in range(min(50, int(rnd.paretovariate(1.5)))):
+            date = created + datetime.timedelta(hours=k * rnd.uniform(0.5, 12))
+            commits_p.append({"sha": self._sha(), "commit": {"author": {"date": iso(date)},
+                              "message": rnd.choice(["Fix test", "Address review", "Update docs", "Initial"]) + f" ({num})"}})
+        self.files_payload[num] = files_p
+        self.commits_payload[num] = commits_p
+        ci = {"success": 0, "failure": 0, "duration_avg_sec": 0}
+        self.records.append({"number": num, "title": title, "merged_at": iso(merged), "created_at": iso(created),
+                             "files": files_r,
+                             "commits": [{"sha": c["sha"], "date": c["commit"]["author"]["date"], "message": c["commit"]["message"]} for c in commits_p],
+                             "ci": ci})
+
+    def _run(self, j):
+        rnd = self.rnd
+        pr = self.prs[rnd.randrange(len(self.prs))]
+        commits = self.commits_payload[pr["number"]]
+        sha = rnd.choice(commits)["sha"] if commits and rnd.random() < 0.8 else self._sha()
+        started = self.anchor - datetime.timedelta(days=rnd.uniform(0, 180))
+        done = started + datetime.timedelta(seconds=rnd.randint(30, 5400))
+        return {"id": 19000000000 + j, "head_sha": sha, "status": "completed", "conclusion": rnd.choice(CONCLUSIONS),
+                "run_started_at": iso(started), "updated_at": iso(done),
+                "pull_requests": [{"number": pr["number"]}] if rnd.random() < 0.5 else []}
+
+    def _finding_site(self):
+        # ~30% находок попадают на добавленные строки PR, остальные — по всему пулу файлов
+        if self.added and self.rnd.random() < 0.3:
+            return self.added[self.rnd.randrange(len(self.added))]
+        return self.paths[self.rnd.randrange(len(self.paths))], self.rnd.randint(1, 3000)
+
+    def write_detekt(self, path):
+        by_file = {}
+        for _ in range(self.n_detekt):
+            p, ln = self._finding_site()
+            by_file.setdefault(p, []).append(ln)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<checkstyle version="4.3">\n')
+            for p, lines in by_file.items():
+                f.write(f'<file name="{p}">\n')
+                for ln in sorted(lines):
+                    f.write(f'\t<error line="{ln}" column="{self.rnd.randint(1, 120)}" severity="{self.rnd.choice(SEVERITIES)}" '
+                            f'message="Unexpected indentation ({self.rnd.randint(0, 8)})" source="{self.rnd.choice(RULES)}" />\n')
+                f.write("</file>\n")
+            f.write("</checkstyle>\n")
+
+    def write_baseline(self, path, detekt_path):
+        # в baseline — каждая пятая находка отчёта, как «старые» нарушения
+        import xml.etree.ElementTree as ET
+        ids = []
+        for _, el in ET.iterparse(detekt_path):
+            if el.tag == "file":
+                name = el.get("name")
+                ids.extend(f"{name}:{e.get('source')}:{e.get('line')}" for e in el.findall("error")[::5])
+                el.clear()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("<SmellBaseline><CurrentIssues>\n")
+            f.writelines(f"<ID>{i}</ID>\n" for i in ids)
+            f.write("</CurrentIssues></SmellBaseline>\n")
+
+    def write_ktlint(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for _ in range(self.n_ktlint):
+                p, ln = self._finding_site()
+                f.write(json.dumps({"file": p, "line": ln, "column": self.rnd.randint(1, 120),
+                                    "rule": self.rnd.choice(KT_RULES), "message": "Unexpected indentation"}) + "\n")
+
+    def hot_map(self, days=90):
+        cutoff = iso(self.anchor - datetime.timedelta(days=days))
+        cnt = {}
+        for r in self.records:
+            for c in r["commits"]:
+                if c["date"] >= cutoff:
+                    for f in r["files"]:
+                        cnt[f["path"]] = cnt.get(f["path"], 0) + 1
+        return cnt
+
+    def write(self, out_dir):
+        """Раскладка как у рабочего каталога конвейера: config.json, data/raw/*, reports/*."""
+        for d in ("data/raw", "data/derived", "reports"):
+            os.makedirs(os.path.join(out_dir, d), exist_ok=True)
+        j = lambda *p: os.path.join(out_dir, *p)
+        cfg = {"repo": "gradle/gradle", "max_pr": len(self.prs), "output_json": "data/derived/dashboard.json",
+               "detekt_report": "reports/detekt.xml", "detekt_baseline": "reports/detekt-baseline.xml",
+               "ktlint_report": "reports/ktlint.json"}
+        with open(j("config.json"), "w", encoding="utf-8") as f:
+            json.dump(cfg, f, indent=2)
+        with open(j("data/raw/pr_enriched.json"), "w", encoding="utf-8") as f:
+            json.dump(self.records, f, ensure_ascii=False)
+        with open(j("data/raw/hot_files_90d.json"), "w", encoding="utf-8") as f:
+            json.dump(self.hot_map(), f, ensure_ascii=False)
+        self.write_detekt(j("reports/detekt.xml"))
+        self.write_baseline(j("reports/detekt-baseline.xml"), j("reports/detekt.xml"))
+        self.write_ktlint(j("reports/ktlint.json"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scale", type=float, default=1)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", required=True)
+    args = ap.parse_args()
+    ds = Dataset(args.scale, args.seed)
+    ds.write(args.out)
+    print(f"{args.out}: {len(ds.prs)} PRs, {sum(len(r['files']) for r in ds.records)} files, "
+          f"{len(ds.runs_payload)} CI runs, {ds.n_detekt} detekt / {ds.n_ktlint} ktlint findings")
+
+
+if __name__ == "__main__":
+    main()